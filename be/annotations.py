@@ -0,0 +1,126 @@
+from datetime import datetime
+from elasticsearch import helpers
+from sqlalchemy.dialects.postgresql import insert
+from models import Annotation
+
+# Values offered by the Label column of the transactions table
+ANNOTATION_LABELS = ('Genuine', 'Fraudulent', 'Suspicious')
+
+
+def parse_annotation(operation):
+    # Validate one {id, index, remark?, tickbox?, label?} operation
+    if not isinstance(operation, dict):
+        raise ValueError("Operation must be an object")
+
+    # index is optional; callers resolve it from the document id when missing
+    doc_id = operation.get('id')
+    index = operation.get('index') or None
+    if not doc_id:
+        raise ValueError("id is required")
+
+    fields = {}
+    if 'remark' in operation:
+        if not isinstance(operation['remark'], str):
+            raise ValueError("remark must be a string")
+        fields['remark'] = operation['remark']
+    if 'tickbox' in operation:
+        if not isinstance(operation['tickbox'], bool):
+            raise ValueError("tickbox must be a boolean")
+        fields['tickbox'] = operation['tickbox']
+    if 'label' in operation:
+        if operation['label'] is not None and operation['label'] not in ANNOTATION_LABELS:
+            raise ValueError(f"label must be one of {', '.join(ANNOTATION_LABELS)}")
+        fields['label'] = operation['label']
+
+    if not fields:
+        raise ValueError("Nothing to update")
+    return index, doc_id, fields
+
+
+def bulk_update(es, updates, chunk_size):
+    # Apply [(index, id, fields)] as partial updates through the _bulk API.
+    # Returns one (ok, error) pair per update, in the same order.
+    actions = (
+        {'_op_type': 'update', '_index': index, '_id': doc_id, 'doc': fields}
+        for index, doc_id, fields in updates
+    )
+    results = []
+    for ok, item in helpers.streaming_bulk(es, actions, chunk_size=chunk_size,
+                                           raise_on_error=False, raise_on_exception=False):
+        info = item.get('update', {})
+        results.append((ok, None if ok else info.get('error', info.get('status'))))
+    return results
+
+
+def ensure_label_mapping(es, index):
+    # Map `label` as a keyword so label filters run inside the ES query
+    es.indices.put_mapping(index=index, properties={"label": {"type": "keyword"}})
+
+
+def mirror_labels(es, updates, chunk_size):
+    # Copy label changes from sidecar writes into the alert documents, the
+    # one annotation field Elasticsearch has to filter on
+    label_updates = [
+        (index, doc_id, {'label': fields['label']})
+        for index, doc_id, fields in updates
+        if 'label' in fields
+    ]
+    if not label_updates:
+        return [(True, None)] * len(updates)
+
+    outcomes = iter(bulk_update(es, label_updates, chunk_size))
+    return [next(outcomes) if 'label' in fields else (True, None) for index, doc_id, fields in updates]
+
+
+def upsert_annotations(session, updates):
+    # Store [(index, id, fields)] in the annotation sidecar table. Rows are
+    # grouped by the fields they set so an upsert only overwrites those
+    # columns; one transaction covers the whole batch.
+    merged = {}
+    for index, doc_id, fields in updates:
+        merged.setdefault((index, doc_id), {}).update(fields)
+
+    groups = {}
+    for (index, doc_id), fields in merged.items():
+        groups.setdefault(tuple(sorted(fields)), []).append((index, doc_id, fields))
+
+    now = datetime.utcnow()
+    try:
+        for columns, rows in groups.items():
+            stmt = insert(Annotation.__table__).values([
+                dict(fields, doc_index=index, doc_id=doc_id, updated_at=now)
+                for index, doc_id, fields in rows
+            ])
+            stmt = stmt.on_conflict_do_update(
+                constraint='uq_annotation_doc',
+                set_={column: stmt.excluded[column] for column in columns + ('updated_at',)}
+            )
+            session.execute(stmt)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return [(True, None)] * len(updates)
+
+
+def merge_annotations(transactions):
+    # Overlay sidecar annotations on formatted transactions with one IN query per page
+    if not transactions:
+        return transactions
+
+    ids = list({transaction['id'] for transaction in transactions})
+    annotations = {
+        (annotation.doc_index, annotation.doc_id): annotation
+        for annotation in Annotation.query.filter(Annotation.doc_id.in_(ids)).all()
+    }
+    for transaction in transactions:
+        annotation = annotations.get((transaction.get('index'), transaction['id']))
+        if annotation is None:
+            continue
+        if annotation.remark is not None:
+            transaction['remark'] = annotation.remark
+        if annotation.tickbox is not None:
+            transaction['tickbox'] = annotation.tickbox
+        if annotation.label is not None:
+            transaction['label'] = annotation.label
+    return transactions
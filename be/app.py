@@ -2,6 +2,8 @@ from flask import Flask
 from flask_socketio import SocketIO
 from elasticsearch import Elasticsearch
 from config import DevelopmentConfig
+from fastjson import FastJSONProvider, es_serializer
+from compression import WebSocketDeflate
 from models import db, User, Role
 from flask_security import Security, SQLAlchemyUserDatastore
 from flask_migrate import Migrate
@@ -12,19 +14,37 @@ from flask_cors import CORS
 # Initialize the Flask app
 app = Flask(__name__)
 app.config.from_object(DevelopmentConfig)  # Use the config
+app.json = FastJSONProvider(app)  # orjson when installed, stdlib json otherwise
 
 # Disable CSRF Protection
 app.config['WTF_CSRF_ENABLED'] = False
 
 # Initialize CORS and SocketIO
-CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
-socketio = SocketIO(app, cors_allowed_origins=app.config['CORS_ALLOWED_ORIGINS'])
+CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True, expose_headers=['Retry-After'])
+socketio = SocketIO(
+    app,
+    cors_allowed_origins=app.config['CORS_ALLOWED_ORIGINS'],
+    message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'],  # None keeps everything in this process
+    channel=app.config['SOCKETIO_CHANNEL'],
+    http_compression=app.config['SOCKETIO_HTTP_COMPRESSION'],
+    compression_threshold=app.config['SOCKETIO_COMPRESSION_THRESHOLD']
+)
+
+# Configured permessage-deflate for the websocket transport
+websocket_deflate = WebSocketDeflate(
+    app.config['WEBSOCKET_DEFLATE_ENABLED'],
+    app.config['WEBSOCKET_DEFLATE_LEVEL'],
+    app.config['WEBSOCKET_DEFLATE_MIN_SIZE'],
+    app.config['WEBSOCKET_DEFLATE_MAX_WINDOW_BITS'],
+    app.config['WEBSOCKET_DEFLATE_NO_CONTEXT_TAKEOVER']
+)
 
 # Setup Elasticsearch client with basic authentication
 es = Elasticsearch(
     app.config['ES_HOST'],
     ssl_context=app.config['SSL_CONTEXT'],
-    basic_auth=app.config['ES_BASIC_AUTH']
+    basic_auth=app.config['ES_BASIC_AUTH'],
+    serializer=es_serializer()  # None keeps the client's default serializer
 )
 
 # Initialize SQLAlchemy and Flask-Migrate
@@ -44,9 +64,18 @@ app.logger.addHandler(handler)
 
 app.logger.setLevel(logging.DEBUG)  # Ensure the logger is set to capture debug level logs
 
+if not websocket_deflate.install(socketio.async_mode) and app.config['WEBSOCKET_DEFLATE_ENABLED']:
+    app.logger.warning(f"WEBSOCKET_DEFLATE_* settings only apply in the threading async mode, "
+                       f"not '{socketio.async_mode}'; websocket messages use the server's defaults")
+
 # Import routes after all the initializations to avoid circular imports
 from routes import init_routes
-init_routes(app)
+start_background_tasks = init_routes(app)
+
+# Background tasks start with the server (or its first request under a
+# WSGI server), not on import, so CLI commands such as `flask ingest` run
+# without them. Starting is idempotent.
+app.before_request(start_background_tasks)
 
 # Create roles before the first request
 @app.before_request
@@ -75,4 +104,5 @@ def create_roles():
 
 if __name__ == '__main__':
     app.logger.info("Start Web Fraud App")
+    start_background_tasks()
     socketio.run(app, debug=True)
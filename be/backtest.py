@@ -0,0 +1,267 @@
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+import numpy as np
+from rules import RULE_FIELDS, CompiledRules
+from transactions import iter_transactions
+
+# Stored labels that decide whether a rule firing was right or wrong;
+# Suspicious and unlabelled alerts count as hits but not toward precision
+FRAUD_LABEL = 'Fraudulent'
+GENUINE_LABEL = 'Genuine'
+
+# Rule sets compiled in a pool worker, by job, so a job compiles once per worker
+MAX_COMPILED_RULE_SETS = 8
+_compiled_rule_sets = OrderedDict()
+
+
+def source_fields(rules):
+    # Only the fields the rules read, plus the label, leave Elasticsearch
+    fields = {'label'}
+    for rule in rules:
+        for condition in rule['conditions']:
+            field = condition['field']
+            fields.add('Products.Product Name' if RULE_FIELDS[field] == 'product' else field)
+    return sorted(fields)
+
+
+def evaluate_batch(job_id, rules, transactions, labels):
+    # Runs in a pool worker. Returns per-rule counters for one batch; the
+    # documents themselves never travel back to the parent process.
+    compiled = _compiled_rule_sets.get(job_id)
+    if compiled is None:
+        compiled = _compiled_rule_sets[job_id] = CompiledRules(rules)
+        while len(_compiled_rule_sets) > MAX_COMPILED_RULE_SETS:
+            _compiled_rule_sets.popitem(last=False)
+
+    hits, _ = compiled.evaluate(transactions)
+    labels = np.array(labels, dtype=object)
+    fraud = labels == FRAUD_LABEL
+    genuine = labels == GENUINE_LABEL
+    fired = hits.any(axis=0)
+    return {
+        'documents': len(transactions),
+        'hits': hits.sum(axis=1),
+        'fraud_hits': (hits & fraud).sum(axis=1),
+        'genuine_hits': (hits & genuine).sum(axis=1),
+        'fired': int(fired.sum()),
+        'fired_fraud': int((fired & fraud).sum()),
+        'fired_genuine': int((fired & genuine).sum()),
+        'fraud': int(fraud.sum()),
+        'genuine': int(genuine.sum())
+    }
+
+
+def _precision(fraud_hits, genuine_hits):
+    labelled = fraud_hits + genuine_hits
+    return round(fraud_hits / labelled, 4) if labelled else None
+
+
+class BacktestJob:
+    # One backtest: its rule set and time range, plus the counters merged
+    # in from every evaluated batch
+
+    def __init__(self, rules, index, start, end):
+        self.id = uuid.uuid4().hex
+        self.rules = rules
+        self.index = index
+        self.start = start
+        self.end = end
+        self.state = 'queued'
+        self.error = None
+        self.total = None
+        self.created_at = datetime.utcnow().isoformat()
+        self.finished_at = None
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+        self._documents = 0
+        self._hits = np.zeros(len(rules), dtype=np.int64)
+        self._fraud_hits = np.zeros(len(rules), dtype=np.int64)
+        self._genuine_hits = np.zeros(len(rules), dtype=np.int64)
+        self._counts = dict.fromkeys(('fired', 'fired_fraud', 'fired_genuine', 'fraud', 'genuine'), 0)
+
+    def add(self, result):
+        with self._lock:
+            self._documents += result['documents']
+            self._hits += result['hits']
+            self._fraud_hits += result['fraud_hits']
+            self._genuine_hits += result['genuine_hits']
+            for key in self._counts:
+                self._counts[key] += result[key]
+
+    def report(self):
+        with self._lock:
+            counts = dict(self._counts)
+            rules = [
+                {
+                    'id': rule['id'],
+                    'name': rule['name'],
+                    'hits': int(hits),
+                    'fraud_hits': int(fraud_hits),
+                    'genuine_hits': int(genuine_hits),
+                    'precision': _precision(int(fraud_hits), int(genuine_hits))
+                }
+                for rule, hits, fraud_hits, genuine_hits
+                in zip(self.rules, self._hits, self._fraud_hits, self._genuine_hits)
+            ]
+            documents = self._documents
+
+        return {
+            'job_id': self.id,
+            'state': self.state,
+            'error': self.error,
+            'index': self.index,
+            'start': self.start,
+            'end': self.end,
+            'documents': documents,
+            'total': self.total,
+            'progress': round(documents / self.total, 4) if self.total else (1.0 if self.state == 'done' else 0.0),
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'elapsed_seconds': round(self.elapsed, 2),
+            'documents_per_second': round(documents / self.elapsed) if self.elapsed else 0,
+            # Any rule of the set firing, scored against the labelled alerts
+            'rule_set': {
+                'hits': counts['fired'],
+                'fraud_hits': counts['fired_fraud'],
+                'genuine_hits': counts['fired_genuine'],
+                'precision': _precision(counts['fired_fraud'], counts['fired_genuine']),
+                'recall': round(counts['fired_fraud'] / counts['fraud'], 4) if counts['fraud'] else None,
+                'labelled_fraud': counts['fraud'],
+                'labelled_genuine': counts['genuine']
+            },
+            'rules': rules
+        }
+
+
+class BacktestRunner:
+    # Replays rule sets over historical alerts. Documents stream out of
+    # Elasticsearch through a point-in-time, projected to the fields the
+    # rules read; batches fan out to a process pool for evaluation and only
+    # counters come back. At most two batches per worker are in flight, so
+    # memory stays flat however long the time range.
+
+    def __init__(self, es, workers, batch_size, keep_alive, progress_interval, max_jobs, logger):
+        self.es = es
+        self.workers = workers
+        self.batch_size = batch_size
+        self.keep_alive = keep_alive
+        self.progress_interval = progress_interval
+        self.max_jobs = max_jobs
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._executor = None
+        self._jobs = OrderedDict()  # job id -> BacktestJob, oldest first
+        self.completed = 0
+        self.failed = 0
+
+    def _pool(self):
+        # Created on first use, from a thread of a process that is already
+        # running other threads, so workers are never forked from it
+        # directly: a lock held by another thread at fork time would stay
+        # locked in the child for good. A fork server is started once
+        # instead, importing the entry module (app.py starts nothing on
+        # import) and this one, and workers are forked from that
+        # single-threaded process. Spawn is the fallback where there is no
+        # fork server.
+        with self._lock:
+            if self._executor is None:
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                    context.set_forkserver_preload(['__main__', __name__])
+                else:
+                    context = multiprocessing.get_context('spawn')
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._executor
+
+    def _discard_pool(self, pool):
+        # A worker died (killed, out of memory); the pool refuses all further
+        # work, so the next job gets a fresh one
+        with self._lock:
+            if self._executor is pool:
+                self._executor = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, rules, index, start, end, on_progress, start_task):
+        # on_progress(report) is called while the job runs and once at the end;
+        # start_task(fn, *args) runs the job in the background
+        job = BacktestJob(rules, index, start, end)
+        with self._lock:
+            self._jobs[job.id] = job
+            # Forget the oldest finished jobs beyond max_jobs
+            for job_id in [job_id for job_id, old in self._jobs.items() if old.state in ('done', 'failed')]:
+                if len(self._jobs) <= self.max_jobs:
+                    break
+                del self._jobs[job_id]
+        start_task(self.run, job, on_progress)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def run(self, job, on_progress):
+        query = {"bool": {"filter": [{"range": {"@timestamp": {"gte": job.start, "lte": job.end}}}]}}
+        started = time.monotonic()
+        reported_at = started
+        job.state = 'running'
+        pool = None
+        try:
+            job.total = self.es.count(index=job.index, query=query)['count']
+            on_progress(job.report())
+
+            pool = self._pool()
+            in_flight = set()
+            batches = iter_transactions(self.es, job.index, query, self.batch_size, self.keep_alive,
+                                        source=source_fields(job.rules))
+            for hits in batches:
+                sources = [hit.get('_source', {}) for hit in hits]
+                labels = [source.get('label') for source in sources]
+                in_flight.add(pool.submit(evaluate_batch, job.id, job.rules, sources, labels))
+                if len(in_flight) >= 2 * self.workers:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job.add(future.result())
+
+                job.elapsed = time.monotonic() - started
+                if time.monotonic() - reported_at >= self.progress_interval:
+                    reported_at = time.monotonic()
+                    on_progress(job.report())
+
+            for future in in_flight:
+                job.add(future.result())
+            job.state = 'done'
+            self.completed += 1
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool) and pool is not None:
+                self._discard_pool(pool)
+            self.logger.error(f"Backtest {job.id} failed: {e}")
+            job.state = 'failed'
+            job.error = str(e)
+            self.failed += 1
+
+        job.elapsed = time.monotonic() - started
+        job.finished_at = datetime.utcnow().isoformat()
+        on_progress(job.report())
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+    def stats(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.state in ('queued', 'running'))
+            return {
+                "workers": self.workers,
+                "jobs": len(self._jobs),
+                "running": running,
+                "completed": self.completed,
+                "failed": self.failed
+            }
@@ -0,0 +1,70 @@
+"""Rule engine comparison: in-process NumPy vs Elasticsearch percolator.
+
+Scores the same synthetic transactions with both engines for each rule
+count, checks that they agree and prints transactions/second side by
+side. Percolator rules go to a throwaway bench-fraud-rules index that is
+deleted afterwards:
+
+    python bench_engines.py --transactions 20000 --rules 10 100 1000
+"""
+import argparse
+import random
+import time
+import numpy as np
+from elasticsearch import Elasticsearch
+from config import DevelopmentConfig
+from rules import RuleBook
+from percolator import PercolatorRules
+from bench_rules import make_transactions, make_rules
+
+BENCH_INDEX = 'bench-fraud-rules'
+
+
+def timed(engine, transactions):
+    started = time.perf_counter()
+    _, scores, matched = engine.score(transactions)
+    return time.perf_counter() - started, scores, matched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--transactions', type=int, default=20000)
+    parser.add_argument('--rules', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--batch-size', type=int, default=DevelopmentConfig.RULE_EVAL_BATCH_SIZE)
+    parser.add_argument('--percolate-batch-size', type=int, default=DevelopmentConfig.PERCOLATOR_BATCH_SIZE)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    es = Elasticsearch(
+        DevelopmentConfig.ES_HOST,
+        ssl_context=DevelopmentConfig.SSL_CONTEXT,
+        basic_auth=DevelopmentConfig.ES_BASIC_AUTH
+    )
+    rng = random.Random(args.seed)
+    transactions = make_transactions(args.transactions, rng)
+
+    print(f"{args.transactions} transactions; numpy batches of {args.batch_size}, "
+          f"percolate batches of {args.percolate_batch_size}")
+    print(f"{'rules':>6} {'numpy tx/s':>12} {'percolator tx/s':>16} {'sync s':>8} {'agree':>8}")
+    try:
+        for rule_count in args.rules:
+            rules = make_rules(rule_count, rng)
+            rule_book = RuleBook(args.batch_size)
+            rule_book.load(rules)
+            percolator = PercolatorRules(es, BENCH_INDEX, args.percolate_batch_size,
+                                         DevelopmentConfig.PERCOLATOR_MAX_RULES)
+            started = time.perf_counter()
+            percolator.sync(rules)
+            sync_seconds = time.perf_counter() - started
+
+            numpy_seconds, numpy_scores, _ = timed(rule_book, transactions)
+            percolator_seconds, percolator_scores, _ = timed(percolator, transactions)
+            agree = float(np.mean(numpy_scores == percolator_scores))
+            print(f"{rule_count:>6} {args.transactions / numpy_seconds:>12,.0f} "
+                  f"{args.transactions / percolator_seconds:>16,.0f} {sync_seconds:>8.2f} {agree:>8.2%}")
+    finally:
+        es.indices.delete(index=BENCH_INDEX, ignore_unavailable=True)
+
+
+if __name__ == '__main__':
+    main()
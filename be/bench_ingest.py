@@ -0,0 +1,98 @@
+"""Ingestion throughput benchmark.
+
+Runs the /ingest pipeline (NDJSON parse, rule scoring, routing and
+parallel_bulk indexing) over synthetic transactions and reports sustained
+transactions/second per stage. Alerts are written to throwaway
+bench-low-alert/bench-med-alert/bench-high-alert indices that are deleted
+afterwards; --dry-run skips Elasticsearch entirely:
+
+    python bench_ingest.py --transactions 200000 --rules 100
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime
+from elasticsearch import Elasticsearch
+from config import DevelopmentConfig
+from rules import RuleBook
+from ingest import iter_ndjson, prepare_alerts, index_alerts
+from bench_rules import make_transactions, make_rules
+
+BENCH_INDICES = {'low': 'bench-low-alert', 'med': 'bench-med-alert', 'high': 'bench-high-alert'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--transactions', type=int, default=200000)
+    parser.add_argument('--rules', type=int, default=100)
+    parser.add_argument('--batch-size', type=int, default=DevelopmentConfig.INGEST_BATCH_SIZE)
+    parser.add_argument('--chunk-size', type=int, default=DevelopmentConfig.INGEST_BULK_CHUNK_SIZE)
+    parser.add_argument('--threads', type=int, default=DevelopmentConfig.INGEST_BULK_THREADS)
+    parser.add_argument('--med-score', type=int, default=DevelopmentConfig.INGEST_MED_SCORE)
+    parser.add_argument('--high-score', type=int, default=DevelopmentConfig.INGEST_HIGH_SCORE)
+    parser.add_argument('--dry-run', action='store_true', help="Score and route only, don't index")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    lines = [json.dumps(transaction) for transaction in make_transactions(args.transactions, rng)]
+    rule_book = RuleBook(args.batch_size)
+    rule_book.load(make_rules(args.rules, rng))
+
+    es = None
+    if not args.dry_run:
+        es = Elasticsearch(
+            DevelopmentConfig.ES_HOST,
+            ssl_context=DevelopmentConfig.SSL_CONTEXT,
+            basic_auth=DevelopmentConfig.ES_BASIC_AUTH
+        )
+
+    timings = {'parse': 0.0, 'score': 0.0, 'index': 0.0}
+    routed = dict.fromkeys(BENCH_INDICES.values(), 0)
+    failed = 0
+
+    def process(transactions):
+        nonlocal failed
+        started = time.perf_counter()
+        actions = prepare_alerts(rule_book, transactions, BENCH_INDICES, args.med_score, args.high_score,
+                                 datetime.utcnow().isoformat())
+        timings['score'] += time.perf_counter() - started
+        for action in actions:
+            routed[action['_index']] += 1
+        if es is not None:
+            started = time.perf_counter()
+            _, failures = index_alerts(es, actions, args.chunk_size, args.threads)
+            timings['index'] += time.perf_counter() - started
+            failed += len(failures)
+
+    try:
+        total_started = time.perf_counter()
+        batch = []
+        started = time.perf_counter()
+        for _, transaction, _ in iter_ndjson(lines):
+            batch.append(transaction)
+            if len(batch) >= args.batch_size:
+                timings['parse'] += time.perf_counter() - started
+                process(batch)
+                batch = []
+                started = time.perf_counter()
+        timings['parse'] += time.perf_counter() - started
+        if batch:
+            process(batch)
+        elapsed = time.perf_counter() - total_started
+    finally:
+        if es is not None:
+            es.indices.delete(index=','.join(BENCH_INDICES.values()), ignore_unavailable=True)
+
+    print(f"{args.transactions} transactions, {args.rules} rules, batches of {args.batch_size}, "
+          f"{args.threads} bulk threads x {args.chunk_size} docs")
+    for stage, seconds in timings.items():
+        if seconds:
+            print(f"{stage:>8}: {seconds:8.3f} s  {args.transactions / seconds:>12,.0f} tx/s")
+    print(f"{'total':>8}: {elapsed:8.3f} s  {args.transactions / elapsed:>12,.0f} tx/s sustained")
+    print("routed: " + ", ".join(f"{index}={count}" for index, count in routed.items()) + f", failed={failed}")
+
+
+if __name__ == '__main__':
+    main()
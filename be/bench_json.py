@@ -0,0 +1,90 @@
+"""JSON encoder microbenchmark.
+
+Encodes /get_transactions-shaped payloads of realistic alert documents
+with Flask's default provider and with FastJSONProvider, and decodes an
+Elasticsearch search response with the stdlib and the fast path:
+
+    python bench_json.py --sizes 10 100 1000 --repeat 50
+"""
+import argparse
+import json
+import random
+import time
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from fastjson import FastJSONProvider, loads, orjson
+from bench_rules import make_transactions
+
+
+def make_payload(size, rng):
+    # Shaped like a /get_transactions response: formatted hits with annotations and velocity
+    transactions = []
+    for number, source in enumerate(make_transactions(size, rng)):
+        source['@timestamp'] = f"2024-08-{rng.randint(1, 28):02d}T{rng.randint(0, 23):02d}:15:42.123Z"
+        source['Order Time'] = source['@timestamp']
+        source['Order ID'] = f"ORD-{rng.randrange(10 ** 8)}"
+        source['Risk Score'] = rng.randint(0, 60)
+        source['Matched Rules'] = rng.sample(range(1, 200), rng.randint(0, 5))
+        for product in source['Products']:
+            product.update({'Product ID': rng.randrange(10 ** 6), 'Quantity': rng.randint(1, 3),
+                            'Unit Price': round(rng.uniform(1, 300), 2), 'Category': rng.choice(['Books', 'Games'])})
+        transactions.append({
+            'id': f"{number:020d}",
+            'index': 'high-alert',
+            'timestamp': source['@timestamp'],
+            'data': source,
+            'tickbox': False,
+            'remark': '',
+            'label': rng.choice([None, 'Genuine', 'Fraudulent']),
+            'velocity': {window: {'orders': rng.randint(1, 9), 'total_price': 120.5, 'countries': 1}
+                         for window in ('1h', '24h')}
+        })
+    return {'total': size, 'transactions': transactions, 'page': 1, 'next_cursor': None,
+            'prev_cursor': None, 'epoch': 'a1b2c3d4', 'seq': 42}
+
+
+def per_call(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    default_provider = DefaultJSONProvider(app)
+    fast_provider = FastJSONProvider(app)
+    rng = random.Random(args.seed)
+    print(f"orjson {'available' if orjson is not None else 'NOT installed, fast path falls back to stdlib'}")
+    print(f"{'rows':>6} {'bytes':>10} {'stdlib ms':>10} {'fast ms':>9} {'speedup':>8} "
+          f"{'decode stdlib ms':>17} {'decode fast ms':>15}")
+
+    for size in args.sizes:
+        payload = make_payload(size, rng)
+        with app.app_context():
+            # Compact, sorted output as served outside debug mode
+            stdlib_ms = per_call(lambda: default_provider.response(payload).get_data(), args.repeat) * 1000
+            fast_ms = per_call(lambda: fast_provider.response(payload).get_data(), args.repeat) * 1000
+            body = fast_provider.response(payload).get_data()
+            assert json.loads(body) == json.loads(default_provider.response(payload).get_data())
+
+        # What the Elasticsearch client decodes for the same page
+        search_response = json.dumps({'hits': {'hits': [
+            {'_index': t['index'], '_id': t['id'], '_source': t['data'], 'sort': [1722500000000]}
+            for t in payload['transactions']
+        ]}}).encode('utf-8')
+        decode_stdlib_ms = per_call(lambda: json.loads(search_response), args.repeat) * 1000
+        decode_fast_ms = per_call(lambda: loads(search_response), args.repeat) * 1000
+
+        print(f"{size:>6} {len(body):>10,} {stdlib_ms:>10.3f} {fast_ms:>9.3f} {stdlib_ms / fast_ms:>7.1f}x "
+              f"{decode_stdlib_ms:>17.3f} {decode_fast_ms:>15.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Rule engine throughput benchmark.
+
+Scores synthetic transactions against 10, 100 and 1,000 generated rules
+and prints transactions/second for each rule count:
+
+    python bench_rules.py --transactions 100000 --batch-size 5000
+"""
+import argparse
+import random
+import time
+from rules import RULE_FIELDS, RuleBook, parse_rule
+
+COUNTRIES = ['US', 'GB', 'FR', 'DE', 'NG', 'RU', 'BR', 'IN', 'CN', 'AE', 'EG', 'MA']
+CITIES = ['New York', 'London', 'Paris', 'Berlin', 'Lagos', 'Moscow', 'Cairo', 'Dubai', 'Mumbai']
+CONTINENTS = ['North America', 'Europe', 'Africa', 'Asia', 'South America']
+PRODUCTS = [f'Product {n}' for n in range(500)]
+
+
+def make_transactions(count, rng):
+    return [
+        {
+            'Total Price': round(rng.lognormvariate(4, 1.2), 2),
+            'Customer ID': str(rng.randrange(50000)),
+            'Customer Name': f'Customer {rng.randrange(50000)}',
+            'Customer Gender': rng.choice(['MALE', 'FEMALE']),
+            'GeoIP City Name': rng.choice(CITIES),
+            'GeoIP Continent Name': rng.choice(CONTINENTS),
+            'GeoIP Country ISO Code': rng.choice(COUNTRIES),
+            'Products': [{'Product Name': rng.choice(PRODUCTS)} for _ in range(rng.randint(1, 4))]
+        }
+        for _ in range(count)
+    ]
+
+
+def make_condition(rng):
+    field = rng.choice(list(RULE_FIELDS))
+    kind = RULE_FIELDS[field]
+    if kind == 'number':
+        return {'field': field, 'op': rng.choice(['gt', 'gte', 'lt']), 'value': rng.choice([50, 100, 250, 500, 1000])}
+    if kind == 'product':
+        return {'field': field, 'op': 'in', 'value': rng.sample(PRODUCTS, 5)}
+    if field == 'GeoIP Country ISO Code':
+        return {'field': field, 'op': 'in', 'value': rng.sample(COUNTRIES, 3)}
+    if field == 'GeoIP City Name':
+        return {'field': field, 'op': 'eq', 'value': rng.choice(CITIES)}
+    if field == 'GeoIP Continent Name':
+        return {'field': field, 'op': 'ne', 'value': rng.choice(CONTINENTS)}
+    if field == 'Customer Gender':
+        return {'field': field, 'op': 'eq', 'value': rng.choice(['MALE', 'FEMALE'])}
+    return {'field': field, 'op': 'in', 'value': [str(rng.randrange(50000)) for _ in range(20)]}
+
+
+def make_rules(count, rng):
+    rules = []
+    for rule_id in range(1, count + 1):
+        fields = parse_rule({
+            'name': f'rule {rule_id}',
+            'conditions': [make_condition(rng) for _ in range(rng.randint(1, 4))],
+            'score': rng.randint(1, 20)
+        })
+        rules.append(dict(fields, id=rule_id))
+    return rules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--transactions', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--rules', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    transactions = make_transactions(args.transactions, rng)
+    print(f"{args.transactions} transactions, batches of {args.batch_size}")
+    print(f"{'rules':>6} {'predicates':>11} {'compile ms':>11} {'seconds':>9} {'tx/s':>12} {'fired':>9}")
+
+    for rule_count in args.rules:
+        rules = make_rules(rule_count, rng)
+        rule_book = RuleBook(args.batch_size)
+        started = time.perf_counter()
+        compiled = rule_book.load(rules)
+        compile_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        _, scores, matched = rule_book.score(transactions)
+        elapsed = time.perf_counter() - started
+
+        fired = sum(1 for rule_ids in matched if rule_ids)
+        print(f"{rule_count:>6} {len(compiled.predicates):>11} {compile_ms:>11.1f} {elapsed:>9.3f} "
+              f"{args.transactions / elapsed:>12,.0f} {fired:>9}")
+
+
+if __name__ == '__main__':
+    main()
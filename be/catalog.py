@@ -0,0 +1,142 @@
+import threading
+import time
+
+# Upper bound on remembered unknown index names
+MAX_REMEMBERED_MISSES = 1024
+
+
+class IndexCatalog:
+    # In-process view of the alert indices and their aliases, so request
+    # handlers never pay a cluster-state round trip just to validate an index
+
+    def __init__(self, es, pattern, ttl, min_refresh_interval, logger):
+        self.es = es
+        self.pattern = pattern
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._indices = []
+        self._concrete = frozenset()
+        self._names = frozenset()
+        self._aliases = {}  # index -> alias names pointing at it
+        self._extra = set()  # Indices outside the alert pattern confirmed by a direct lookup
+        self._missing = {}  # Recently confirmed unknown index -> lookup time
+        self._refreshed_at = None
+        self._forced_at = None
+        self._started = False
+        self._listeners = []
+
+    def on_change(self, listener):
+        # listener(added_names) is called on the first load and whenever a
+        # refresh discovers new indices or aliases
+        self._listeners.append(listener)
+
+    def refresh(self):
+        aliases = self.es.indices.get_alias(index=self.pattern)
+        indices = list(aliases.keys())
+        names = set(indices)
+        alias_map = {}
+        for name, info in aliases.items():
+            alias_map[name] = list(info.get('aliases', {}).keys())
+            names.update(alias_map[name])
+
+        with self._lock:
+            added = names - self._names
+            self._indices = indices
+            self._concrete = frozenset(indices)
+            self._names = frozenset(names)
+            self._aliases = alias_map
+            self._refreshed_at = time.monotonic()
+
+        if added:
+            # First load, a new backing index after a rollover, or a brand new alert index
+            self.logger.info(f"Index catalog picked up new indices: {sorted(added)}")
+            for listener in self._listeners:
+                listener(added)
+
+        self.logger.debug(f"Index catalog refreshed: {indices}")
+        return indices
+
+    def _is_stale(self):
+        return self._refreshed_at is None or time.monotonic() - self._refreshed_at > self.ttl
+
+    def indices(self):
+        # The background task keeps this warm; refresh inline only if it has fallen behind
+        if self._is_stale():
+            self.refresh()
+        return list(self._indices)
+
+    def names_for(self, index):
+        # The index itself plus every alias a client may have queried it through
+        return [index] + self._aliases.get(index, [])
+
+    def tracks(self, index):
+        # Whether index is an alert index or one of its aliases, as opposed
+        # to a pattern or an index outside ALERT_INDEX_PATTERN
+        return index in self._names
+
+    def is_concrete(self, index):
+        # Whether index is an alert index itself rather than an alias of one
+        return index in self._concrete
+
+    def exists(self, index):
+        if self._is_stale():
+            self.refresh()
+        if index in self._names or index in self._extra:
+            return True
+
+        # Cache miss: force one refresh, but never more often than
+        # min_refresh_interval so a client hammering an unknown index is
+        # answered from the cache instead of the cluster
+        now = time.monotonic()
+        with self._lock:
+            force = self._forced_at is None or now - self._forced_at >= self.min_refresh_interval
+            if force:
+                self._forced_at = now
+        if force:
+            self.refresh()
+            if index in self._names:
+                return True
+
+        # Not an alert index; fall back to asking the cluster directly,
+        # remembering hits and briefly remembering misses
+        with self._lock:
+            checked_at = self._missing.get(index)
+            if checked_at is not None and now - checked_at < self.min_refresh_interval:
+                return False
+
+        if self.es.indices.exists(index=index):
+            with self._lock:
+                self._extra.add(index)
+                self._missing.pop(index, None)
+            return True
+
+        with self._lock:
+            if len(self._missing) >= MAX_REMEMBERED_MISSES:
+                self._missing.clear()
+            self._missing[index] = now
+        return False
+
+    def invalidate(self, index=None):
+        # Called when a search reports a missing index or a rollover is suspected
+        with self._lock:
+            if index is not None:
+                self._extra.discard(index)
+                self._missing.pop(index, None)
+            self._refreshed_at = None
+            self._forced_at = None
+
+    def run(self, sleep):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                self.logger.error(f"Error refreshing index catalog: {e}")
+            sleep(self.ttl)
+
+    def start(self, socketio):
+        if self._started:
+            return
+        self._started = True
+        socketio.start_background_task(self.run, socketio.sleep)
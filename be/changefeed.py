@@ -0,0 +1,149 @@
+import threading
+from collections import OrderedDict
+
+# Upper bound on remembered ids that another path already pushed
+MAX_DELIVERED_IDS = 100000
+
+
+class ChangeFeed:
+    # Tails every alert index in the catalog with one search per index per
+    # tick, independent of how many clients are connected or polling
+
+    def __init__(self, es, catalog, interval, batch_size, logger):
+        self.es = es
+        self.catalog = catalog
+        self.interval = interval
+        self.batch_size = batch_size
+        self.logger = logger
+        self._positions = {}  # index -> (last @timestamp sort value, ids seen at that value)
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._delivered = OrderedDict()  # (index, id) -> None, pushed without waiting for a poll
+        self._started = False
+        self.ticks = 0
+        self.documents = 0
+        self.skipped = 0
+
+    def on_new(self, listener):
+        # listener(index, hits) receives new hits oldest-first
+        self._listeners.append(listener)
+
+    def mark_delivered(self, index, ids):
+        # Documents already pushed to clients (e.g. by /ingest); the next
+        # poll advances past them without delivering them again
+        with self._lock:
+            for doc_id in ids:
+                self._delivered[(index, doc_id)] = None
+            while len(self._delivered) > MAX_DELIVERED_IDS:
+                self._delivered.popitem(last=False)
+
+    def _undelivered(self, index, hits):
+        with self._lock:
+            if not self._delivered:
+                return hits
+            fresh = []
+            for hit in hits:
+                key = (index, hit['_id'])
+                if key in self._delivered:
+                    del self._delivered[key]
+                else:
+                    fresh.append(hit)
+        self.skipped += len(hits) - len(fresh)
+        return fresh
+
+    def _latest_position(self, index):
+        res = self.es.search(index=index, body={
+            "query": {"range": {"@timestamp": {"lte": "now"}}},
+            "size": self.batch_size,
+            "sort": [{"@timestamp": "desc"}],
+            "_source": False,
+            "track_total_hits": False
+        })
+        hits = res.get('hits', {}).get('hits', [])
+        if not hits:
+            return (0, frozenset())
+        newest = hits[0]['sort'][0]
+        return (newest, frozenset(hit['_id'] for hit in hits if hit['sort'][0] == newest))
+
+    def poll_index(self, index):
+        position = self._positions.get(index)
+        if position is None:
+            # Start from the current head; history is served by /get_transactions
+            self._positions[index] = self._latest_position(index)
+            return []
+
+        last_value, boundary_ids = position
+        # search_after one millisecond before the last position so documents
+        # indexed late with the same timestamp are still picked up. The ones
+        # already delivered at that timestamp are excluded by the query
+        # itself rather than filtered afterwards: when more than batch_size
+        # documents share a timestamp, each poll then gets the next ones
+        # instead of the same first batch forever. (_shard_doc is no
+        # tiebreaker here, it is only stable within one point-in-time.)
+        query = {"bool": {"filter": [{"range": {"@timestamp": {"lte": "now"}}}]}}
+        if boundary_ids:
+            query["bool"]["must_not"] = [{"ids": {"values": sorted(boundary_ids)}}]
+        res = self.es.search(index=index, body={
+            "query": query,
+            "size": self.batch_size,
+            "sort": [{"@timestamp": "asc"}],
+            "search_after": [last_value - 1],
+            "track_total_hits": False
+        })
+        hits = res.get('hits', {}).get('hits', [])
+        if not hits:
+            return []
+
+        newest = hits[-1]['sort'][0]
+        ids = {hit['_id'] for hit in hits if hit['sort'][0] == newest}
+        if newest == last_value:
+            ids |= boundary_ids
+        self._positions[index] = (newest, frozenset(ids))
+        return hits
+
+    def tick(self):
+        indices = self.catalog.indices()
+        for index in list(self._positions):
+            if index not in indices:
+                del self._positions[index]
+
+        for index in indices:
+            try:
+                hits = self.poll_index(index)
+            except Exception as e:
+                self.logger.error(f"Change feed failed to poll '{index}': {e}")
+                continue
+            hits = self._undelivered(index, hits)
+            if not hits:
+                continue
+
+            self.documents += len(hits)
+            self.logger.debug(f"Change feed found {len(hits)} new documents in '{index}'")
+            for listener in self._listeners:
+                try:
+                    listener(index, hits)
+                except Exception as e:
+                    self.logger.error(f"Change feed listener failed for '{index}': {e}")
+        self.ticks += 1
+
+    def run(self, sleep):
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                self.logger.error(f"Error in change feed: {e}")
+            sleep(self.interval)
+
+    def start(self, socketio):
+        if self._started:
+            return
+        self._started = True
+        socketio.start_background_task(self.run, socketio.sleep)
+
+    def stats(self):
+        return {
+            "indices": len(self._positions),
+            "ticks": self.ticks,
+            "documents": self.documents,
+            "skipped": self.skipped
+        }
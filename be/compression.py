@@ -0,0 +1,204 @@
+import gzip
+import threading
+import time
+import zlib
+from flask import request
+from wsproto.extensions import PerMessageDeflate
+from wsproto.frame_protocol import Opcode
+
+try:
+    import brotli
+except ImportError:  # Optional; without it responses are only ever gzipped
+    brotli = None
+
+# Every content coding a response may be sent in
+CONTENT_ENCODINGS = ('br', 'gzip')
+
+
+def encoded_etags(etag):
+    # A strong ETag and the tags its compressed variants are sent with
+    return [etag] + [f"{etag}-{encoding}" for encoding in CONTENT_ENCODINGS]
+
+
+class _CompressionStats:
+    # Counters shared by the REST and websocket compressors: payloads
+    # compressed and passed through, bytes before and after, and the CPU
+    # time spent compressing (thread time, so waits on I/O don't count)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.compressed = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+
+    def record(self, bytes_in, bytes_out, cpu_seconds):
+        with self._lock:
+            self.compressed += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.cpu_seconds += cpu_seconds
+
+    def skip(self):
+        with self._lock:
+            self.skipped += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "compressed": self.compressed,
+                "skipped": self.skipped,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "bytes_saved": self.bytes_in - self.bytes_out,
+                "ratio": round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else 0.0,
+                "cpu_seconds": round(self.cpu_seconds, 6)
+            }
+
+
+class ResponseCompressor(_CompressionStats):
+    # after_request hook that compresses REST responses with the best
+    # encoding the client accepts: br when brotli is installed, then gzip.
+    # Only buffered 2xx responses of the given mimetypes and at least
+    # min_size bytes are compressed; streamed ones such as exports are left
+    # alone so they keep flowing row by row.
+
+    def __init__(self, min_size, gzip_level, brotli_quality, mimetypes):
+        super().__init__()
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.mimetypes = set(mimetypes)
+        self.encodings = CONTENT_ENCODINGS if brotli is not None else ('gzip',)
+
+    def init_app(self, app):
+        app.after_request(self.compress)
+
+    def negotiate(self, accept_encodings):
+        # The accepted encoding with the highest quality, ties going to the
+        # first of self.encodings; None for identity
+        best, best_quality = None, 0
+        for encoding in self.encodings:
+            quality = accept_encodings[encoding]
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def _encode(self, encoding, body):
+        if encoding == 'br':
+            return brotli.compress(body, quality=self.brotli_quality)
+        # mtime=0 keeps the output identical for identical bodies
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    def compress(self, response):
+        if (response.direct_passthrough or response.is_streamed or not 200 <= response.status_code < 300
+                or response.mimetype not in self.mimetypes or 'Content-Encoding' in response.headers):
+            return response
+        response.vary.add('Accept-Encoding')  # Caches must key on it whether or not this one is compressed
+
+        body = response.get_data()
+        encoding = self.negotiate(request.accept_encodings)
+        if encoding is None or len(body) < self.min_size:
+            self.skip()
+            return response
+
+        started = time.thread_time()
+        compressed = self._encode(encoding, body)
+        self.record(len(body), len(compressed), time.thread_time() - started)
+        response.set_data(compressed)  # Also updates Content-Length
+        response.headers['Content-Encoding'] = encoding
+        # A strong tag names exact bytes, so each encoding gets its own
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(f"{etag}-{encoding}")
+        return response
+
+    def stats(self):
+        return {**super().stats(), "encodings": list(self.encodings), "min_size": self.min_size}
+
+
+class WebSocketDeflate(_CompressionStats):
+    # permessage-deflate for the Socket.IO websocket transport in the
+    # threading async mode, where simple_websocket serves websockets.
+    # simple_websocket offers every client a default PerMessageDeflate and
+    # gives no way to configure it, so install() replaces the class it
+    # builds the extension from with this factory. Messages under min_size
+    # are sent uncompressed, which RFC 7692 allows per message.
+
+    def __init__(self, enabled, level, min_size, max_window_bits, no_context_takeover):
+        super().__init__()
+        self.enabled = enabled
+        self.level = level
+        self.min_size = min_size
+        self.max_window_bits = max_window_bits  # Smaller windows use less memory per connection
+        self.no_context_takeover = no_context_takeover  # Frees the compressor between messages
+        self.connections = 0
+
+    def install(self, async_mode):
+        # eventlet and gevent serve websockets without simple_websocket, so
+        # there is nothing to configure; returns whether it was installed
+        if async_mode != 'threading':
+            self.enabled = False
+            return False
+        import simple_websocket.ws
+        simple_websocket.ws.PerMessageDeflate = self
+        return True
+
+    def __call__(self):
+        return _MeteredPerMessageDeflate(self)
+
+    def negotiated(self):
+        with self._lock:
+            self.connections += 1
+
+    def stats(self):
+        return {
+            **super().stats(),
+            "enabled": self.enabled,
+            "connections": self.connections,
+            "min_size": self.min_size,
+            "level": self.level,
+            "max_window_bits": self.max_window_bits,
+            "no_context_takeover": self.no_context_takeover
+        }
+
+
+class _MeteredPerMessageDeflate(PerMessageDeflate):
+    # Server side of one connection, configured and metered by its WebSocketDeflate
+
+    def __init__(self, settings):
+        super().__init__(server_no_context_takeover=settings.no_context_takeover,
+                         server_max_window_bits=settings.max_window_bits)
+        self.settings = settings
+        self._outbound_compressed = False
+
+    def accept(self, offer):
+        # Declining the offer leaves the connection uncompressed
+        if not self.settings.enabled:
+            return None
+        accepted = super().accept(offer)
+        if accepted is not None:
+            # A client may ask for a window up to 15 bits; compressing with
+            # a smaller one than agreed is always safe for it to inflate
+            self.server_max_window_bits = min(self.server_max_window_bits, self.settings.max_window_bits)
+            self.settings.negotiated()
+        return accepted
+
+    def frame_outbound(self, proto, opcode, rsv, data, fin):
+        if not self._compressible_opcode(opcode):
+            return rsv, data
+        # Only the first frame of a message decides, continuations follow it
+        if opcode is not Opcode.CONTINUATION:
+            self._outbound_compressed = len(data) >= self.settings.min_size
+            if not self._outbound_compressed:
+                self.settings.skip()
+        if not self._outbound_compressed:
+            return rsv, data
+
+        if self._compressor is None:
+            self._compressor = zlib.compressobj(self.settings.level, zlib.DEFLATED, -int(self.server_max_window_bits))
+        started = time.thread_time()
+        rsv, compressed = super().frame_outbound(proto, opcode, rsv, data, fin)
+        self.settings.record(len(data), len(compressed), time.thread_time() - started)
+        return rsv, compressed
@@ -0,0 +1,209 @@
+import os
+import threading
+from collections import OrderedDict, deque
+from fastjson import dumps, loads
+
+try:
+    import redis
+except ImportError:  # Optional; only needed for sequences shared between workers
+    redis = None
+
+# Numbers the next delta of an index and moves its rooms to it, returning
+# the epoch, the new sequence and each room's previous one (base_seq).
+# KEYS: epoch, index sequence, index rooms hash. ARGV: candidate epoch,
+# rooms hash TTL, then the rooms.
+_ADVANCE_SCRIPT = """
+redis.call('SET', KEYS[1], ARGV[1], 'NX')
+local epoch = redis.call('GET', KEYS[1])
+local seq = redis.call('INCR', KEYS[2])
+local bases = {}
+for i = 3, #ARGV do
+    bases[#bases + 1] = redis.call('HGET', KEYS[3], ARGV[i]) or '0'
+    redis.call('HSET', KEYS[3], ARGV[i], seq)
+end
+redis.call('EXPIRE', KEYS[3], ARGV[2])
+return {epoch, seq, bases}
+"""
+
+# The epoch and an index's current sequence. KEYS: epoch, index sequence.
+# ARGV: candidate epoch.
+_POSITION_SCRIPT = """
+redis.call('SET', KEYS[1], ARGV[1], 'NX')
+return {redis.call('GET', KEYS[1]), tonumber(redis.call('GET', KEYS[2]) or '0')}
+"""
+
+
+class RedisSequences:
+    # Epoch, per-index sequences, per-room delivery positions and the
+    # replay history kept in Redis, so every worker numbers the deltas of
+    # an index from one counter and can replay those published by any
+    # other. A client whose REST call landed on one worker can then patch
+    # with deltas from any other. Room positions and history of an index
+    # are dropped after room_ttl seconds without a delta, when no client
+    # can have missed one.
+
+    def __init__(self, url, prefix, room_ttl=86400):
+        if redis is None:
+            raise RuntimeError("Shared delta sequences need the redis package")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.room_ttl = room_ttl
+        self._advance = self.client.register_script(_ADVANCE_SCRIPT)
+        self._position = self.client.register_script(_POSITION_SCRIPT)
+
+    def _keys(self, index):
+        return [f"{self.prefix}:epoch", f"{self.prefix}:seq:{index}", f"{self.prefix}:rooms:{index}"]
+
+    def position(self, index):
+        epoch, seq = self._position(keys=self._keys(index)[:2], args=[os.urandom(4).hex()])
+        return epoch.decode('ascii'), int(seq)
+
+    def advance(self, index, rooms):
+        epoch, seq, bases = self._advance(keys=self._keys(index), args=[os.urandom(4).hex(), self.room_ttl, *rooms])
+        return epoch.decode('ascii'), int(seq), [int(base) for base in bases]
+
+    def record(self, index, seq, sent, replay_size):
+        # Keep the [(room, payload)] sent for seq, and only the replay_size
+        # newest. Scored by sequence, since workers may record out of order.
+        key = f"{self.prefix}:history:{index}"
+        pipe = self.client.pipeline()
+        pipe.zadd(key, {dumps([seq, sent]): seq})
+        pipe.zremrangebyrank(key, 0, -replay_size - 1)
+        pipe.expire(key, self.room_ttl)
+        pipe.execute()
+
+    def history(self, index, since_seq):
+        # [(seq, [(room, payload)])] recorded after since_seq, oldest first
+        entries = self.client.zrangebyscore(f"{self.prefix}:history:{index}", f"({since_seq}", '+inf')
+        return [(seq, [tuple(pair) for pair in sent]) for seq, sent in map(loads, entries)]
+
+
+class DeltaSequencer:
+    # Numbers live-update deltas per index. Every delta names the sequence
+    # of the previous delta delivered to the same room (base_seq); a client
+    # whose last seen sequence is at least base_seq has everything that
+    # room was sent and can apply the patch, otherwise it must refetch.
+    # The epoch changes whenever the process restarts so clients never
+    # compare sequences from two different counters. The last replay_size
+    # deltas of each index are kept so a reconnecting client can be sent
+    # just the ones it missed. With shared (RedisSequences) the epoch,
+    # sequences, room positions and that history come from Redis instead.
+
+    def __init__(self, max_rooms, replay_size, shared=None):
+        self.epoch = os.urandom(4).hex()
+        self.max_rooms = max_rooms
+        self.replay_size = replay_size
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._seqs = {}  # index -> last sequence issued
+        self._room_seqs = OrderedDict()  # (index, room) -> last sequence delivered
+        self._floors = {}  # index -> highest sequence among forgotten rooms
+        self._history = {}  # index -> deque of (seq, [(room, payload)])
+        self.deltas = 0
+        self.replays = 0
+        self.replayed_deltas = 0
+        self.resyncs = 0
+
+    def _position(self, index):
+        if self.shared is not None:
+            return self.shared.position(index)
+        return self.epoch, self._seqs.get(index, 0)
+
+    def position(self, index):
+        # (epoch, last sequence issued) for index
+        if self.shared is not None:
+            return self._position(index)
+        with self._lock:
+            return self._position(index)
+
+    def _advance(self, index, rooms):
+        # Under the lock: (epoch, new sequence, base_seq per room)
+        if self.shared is not None:
+            return self.shared.advance(index, rooms)
+        seq = self._seqs.get(index, 0) + 1
+        self._seqs[index] = seq
+        bases = []
+        for room in rooms:
+            key = (index, room)
+            bases.append(self._room_seqs.pop(key, self._floors.get(index, 0)))
+            self._room_seqs[key] = seq
+            while len(self._room_seqs) > self.max_rooms:
+                (old_index, _), old_seq = self._room_seqs.popitem(last=False)
+                self._floors[old_index] = max(self._floors.get(old_index, 0), old_seq)
+        return self.epoch, seq, bases
+
+    def publish(self, index, room_deltas, send):
+        # room_deltas: [(room, {'inserted': [...], 'changed': [...], 'evicted': [...]})]
+        # send(room, payload) runs under the lock so deltas leave in sequence order
+        with self._lock:
+            epoch, seq, bases = self._advance(index, [room for room, delta in room_deltas])
+            sent = []
+            if self.shared is None:
+                history = self._history.get(index)
+                if history is None:
+                    history = self._history[index] = deque(maxlen=self.replay_size)
+                history.append((seq, sent))
+            for (room, delta), base_seq in zip(room_deltas, bases):
+                payload = {
+                    'index': index,
+                    'epoch': epoch,
+                    'seq': seq,
+                    'base_seq': base_seq,
+                    'inserted': delta.get('inserted', []),
+                    'changed': delta.get('changed', []),
+                    'evicted': delta.get('evicted', [])
+                }
+                send(room, payload)
+                sent.append((room, payload))
+                self.deltas += 1
+            if self.shared is not None:
+                self.shared.record(index, seq, sent, self.replay_size)
+            return seq
+
+    def replay(self, index, rooms, epoch, since_seq, send, join=None):
+        # Re-send the deltas for rooms issued after since_seq. Returns False
+        # when the client must resync: different epoch, or part of the gap
+        # has already been evicted from the buffer. join() runs under the
+        # lock so no live delta can slip in between joining and replaying.
+        with self._lock:
+            if join is not None:
+                join()
+            current_epoch, current = self._position(index)
+            if epoch != current_epoch or since_seq > current:
+                self.resyncs += 1
+                return False
+            if since_seq == current:
+                return True
+
+            # Every delta of the gap must be here; with shared sequences one
+            # may have been numbered but not recorded yet
+            if self.shared is not None:
+                history = self.shared.history(index, since_seq)
+            else:
+                history = self._history.get(index) or ()
+            # Deltas numbered after the position was read reach the client live
+            gap = [(seq, sent) for seq, sent in history if since_seq < seq <= current]
+            if len(gap) != current - since_seq:
+                self.resyncs += 1
+                return False
+
+            self.replays += 1
+            for seq, sent in gap:
+                for room, payload in sent:
+                    if room in rooms:
+                        send(room, payload)
+                        self.replayed_deltas += 1
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "epoch": self.epoch,
+                "shared": self.shared is not None,
+                "indices": len(self._seqs),
+                "rooms": len(self._room_seqs),
+                "deltas": self.deltas,
+                "replays": self.replays,
+                "replayed_deltas": self.replayed_deltas,
+                "resyncs": self.resyncs
+            }
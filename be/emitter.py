@@ -0,0 +1,20 @@
+from flask_socketio import SocketIO
+from config import DevelopmentConfig
+
+
+def create_emitter(message_queue=None, channel=None, client_manager=None):
+    # Write-only Socket.IO handle for processes outside the web workers
+    # (ingestion scripts, cron jobs). It never accepts connections; its
+    # emits go through the message queue to the sockets on every worker:
+    #
+    #     emitter = create_emitter('redis://localhost:6379/0')
+    #     emitter.emit('transactions_delta', payload, to='index:high-alert')
+    #
+    # client_manager, a write-only socketio.PubSubManager, publishes
+    # through a broker Flask-SocketIO has no URL scheme for.
+    message_queue = message_queue or DevelopmentConfig.SOCKETIO_MESSAGE_QUEUE
+    if not message_queue:
+        raise ValueError("A message queue URL is required to emit from another process")
+    if client_manager is not None:
+        return SocketIO(message_queue=message_queue, client_manager=client_manager)
+    return SocketIO(message_queue=message_queue, channel=channel or DevelopmentConfig.SOCKETIO_CHANNEL)
@@ -0,0 +1,88 @@
+import hashlib
+import os
+import threading
+import time
+from flask import Response
+from compression import encoded_etags
+
+
+class Generations:
+    # Version counters behind the ETags of conditional GETs. Each name (an
+    # alert index or alias, or a table group such as 'users') is bumped
+    # whenever something it serves changes, so a tag can be derived and
+    # checked before doing any work. Names nothing bumps, such as wildcard
+    # patterns, follow the total over every name instead. The epoch changes
+    # with the process, and with max_age set tags also roll over every
+    # max_age seconds, bounding how long a change made through another
+    # worker can go unnoticed.
+
+    def __init__(self, max_age):
+        self.epoch = os.urandom(4).hex()
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._counters = {}  # name -> generation
+        self._total = 0
+        self._everything = 0  # Bumped by changes that may affect any name
+        self.bumps = 0
+        self.checks = 0
+        self.not_modified = 0
+
+    def bump(self, names):
+        with self._lock:
+            for name in names:
+                self._counters[name] = self._counters.get(name, 0) + 1
+                self._total += 1
+            self.bumps += 1
+
+    def bump_all(self):
+        with self._lock:
+            self._everything += 1
+            self.bumps += 1
+
+    def etag(self, name, tracked=True, variant=''):
+        # Strong tag for name as it is now; variant tells apart the
+        # representations of one name, e.g. the query string
+        with self._lock:
+            generation = self._counters.get(name, 0) if tracked else self._total
+            everything = self._everything
+        window = int(time.time() // self.max_age) if self.max_age else 0
+        key = f"{self.epoch}|{window}|{everything}|{name}|{generation}|{variant}"
+        return hashlib.blake2b(key.encode('utf-8'), digest_size=12).hexdigest()
+
+    def match(self, if_none_match, etag):
+        # The tag the client already holds for etag, in any content
+        # encoding, or None when it has to be sent the body
+        with self._lock:
+            self.checks += 1
+        for candidate in encoded_etags(etag):
+            if if_none_match.contains_weak(candidate):
+                with self._lock:
+                    self.not_modified += 1
+                return candidate
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "epoch": self.epoch,
+                "max_age": self.max_age,
+                "names": len(self._counters),
+                "bumps": self.bumps,
+                "checks": self.checks,
+                "not_modified": self.not_modified,
+                "hit_ratio": round(self.not_modified / self.checks, 4) if self.checks else 0.0
+            }
+
+
+def with_etag(response, etag, private=False):
+    # Browsers keep the body and revalidate it on every use, so unchanged
+    # data costs a 304 instead of a download
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    if private:
+        response.cache_control.private = True
+    return response
+
+
+def not_modified(etag, private=False):
+    return with_etag(Response(status=304), etag, private)
@@ -0,0 +1,73 @@
+import json
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # Optional; everything falls back to the stdlib encoder
+    orjson = None
+
+
+def loads(data):
+    # Parse JSON text or UTF-8 bytes
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj):
+    # Compact JSON text, e.g. one NDJSON line
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, separators=(',', ':'))
+
+
+def es_serializer():
+    # Serializer for the Elasticsearch client: orjson when installed, so
+    # search responses are decoded by it too; None keeps the client default
+    try:
+        from elasticsearch.serializer import OrjsonSerializer
+    except ImportError:
+        return None
+    return OrjsonSerializer()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    # Flask JSON provider that encodes with orjson when it's installed.
+    # Output matches the default provider: dates still go through `default`
+    # (RFC 822), keys are sorted when sort_keys is set and responses are
+    # indented in debug mode. Non-ASCII text is written as UTF-8 instead of
+    # \u escapes. Anything orjson rejects, such as integers wider than 64
+    # bits, is retried with the stdlib encoder.
+
+    def _orjson_dumps(self, obj, indent=False):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs.keys() - {'indent', 'separators'}:
+            return super().dumps(obj, **kwargs)
+        try:
+            return self._orjson_dumps(obj, indent=bool(kwargs.get('indent'))).decode('utf-8')
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        try:
+            # orjson produces bytes, which become the response body as they are
+            body = self._orjson_dumps(obj, indent=indent) + b"\n"
+        except TypeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body, mimetype=self.mimetype)
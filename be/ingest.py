@@ -0,0 +1,73 @@
+import numpy as np
+from elasticsearch import helpers
+from fastjson import loads
+
+# Alert levels in ascending order of risk
+ALERT_LEVELS = ('low', 'med', 'high')
+
+
+def iter_ndjson(lines):
+    # Yield (line number, transaction, error) for every non-blank line;
+    # exactly one of transaction and error is set
+    for number, line in enumerate(lines, 1):
+        line = line.strip()  # Bytes are parsed as they are, without decoding first
+        if not line:
+            continue
+        try:
+            transaction = loads(line)
+        except ValueError as e:
+            yield number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(transaction, dict):
+            yield number, None, "Each line must be a JSON object"
+            continue
+        yield number, transaction, None
+
+
+def route_alerts(scores, indices, med_score, high_score):
+    # Target index per score: high at or above high_score, med at or above
+    # med_score, low below that
+    targets = np.array([indices[level] for level in ALERT_LEVELS], dtype=object)
+    return targets[(scores >= med_score).astype(np.intp) + (scores >= high_score)]
+
+
+def prepare_alerts(rule_book, transactions, indices, med_score, high_score, timestamp):
+    # Score a batch and build one bulk index action per transaction. Alerts
+    # keep the raw transaction, get @timestamp if they lack one, and record
+    # the score and the rules that produced it.
+    compiled, scores, matched = rule_book.score(transactions)
+    targets = route_alerts(scores, indices, med_score, high_score)
+    actions = []
+    for transaction, score, rule_ids, index in zip(transactions, scores, matched, targets):
+        source = dict(transaction)
+        source.setdefault('@timestamp', timestamp)
+        source['Risk Score'] = int(score)
+        source['Matched Rules'] = rule_ids
+        actions.append({'_op_type': 'index', '_index': index, '_source': source})
+    return actions
+
+
+def index_alerts(es, actions, chunk_size, thread_count, on_chunk=None):
+    # Write actions with parallel_bulk. Returns ({index: [hit]}, [(position, error)])
+    # where each hit looks like a search hit, oldest first, for the push path.
+    # on_chunk(index, ids) is called for every chunk_size results as they
+    # come back, before the rest of the batch is written.
+    indexed = {}
+    failures = []
+    chunk = {}
+    results = helpers.parallel_bulk(es, actions, thread_count=thread_count, chunk_size=chunk_size,
+                                    raise_on_error=False, raise_on_exception=False)
+    # parallel_bulk yields results in the order the actions were given
+    for position, (action, (ok, item)) in enumerate(zip(actions, results), 1):
+        info = item.get('index', {})
+        if ok:
+            index = info.get('_index', action['_index'])
+            indexed.setdefault(index, []).append({'_index': index, '_id': info['_id'], '_source': action['_source']})
+            chunk.setdefault(index, []).append(info['_id'])
+        else:
+            failures.append((position - 1, info.get('error', info.get('status'))))
+        if on_chunk is not None and (position % chunk_size == 0 or position == len(actions)):
+            for index, ids in chunk.items():
+                on_chunk(index, ids)
+            chunk = {}
+    return indexed, failures
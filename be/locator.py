@@ -0,0 +1,82 @@
+import threading
+from collections import OrderedDict
+
+
+class DocLocator:
+    # Bounded LRU map of document id -> concrete index, learned from the
+    # hits the app already serves, so annotation writes can be routed
+    # without a lookup. Unknown ids are resolved with one multi-index ids
+    # search across the alert pattern.
+
+    def __init__(self, es, pattern, max_entries):
+        self.es = es
+        self.pattern = pattern
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lookups = 0
+        self.evictions = 0
+
+    def remember(self, doc_id, index):
+        with self._lock:
+            self._entries[doc_id] = index
+            self._entries.move_to_end(doc_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def learn(self, hits):
+        for hit in hits:
+            if hit.get('_id') and hit.get('_index'):
+                self.remember(hit['_id'], hit['_index'])
+
+    def forget(self, doc_id):
+        with self._lock:
+            self._entries.pop(doc_id, None)
+
+    def locate_many(self, doc_ids):
+        # id -> index for every id that exists; unknown ids are left out
+        found = {}
+        missing = []
+        with self._lock:
+            for doc_id in dict.fromkeys(doc_ids):
+                index = self._entries.get(doc_id)
+                if index is None:
+                    missing.append(doc_id)
+                    self.misses += 1
+                else:
+                    self._entries.move_to_end(doc_id)
+                    found[doc_id] = index
+                    self.hits += 1
+
+        if missing:
+            with self._lock:
+                self.lookups += 1
+            res = self.es.search(index=self.pattern, body={
+                "query": {"ids": {"values": missing}},
+                "size": len(missing),
+                "_source": False,
+                "track_total_hits": False
+            })
+            for hit in res.get('hits', {}).get('hits', []):
+                # An id present in several indices resolves to the first hit
+                if hit['_id'] not in found:
+                    found[hit['_id']] = hit['_index']
+                    self.remember(hit['_id'], hit['_index'])
+        return found
+
+    def locate(self, doc_id):
+        return self.locate_many([doc_id]).get(doc_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "lookups": self.lookups,
+                "evictions": self.evictions
+            }
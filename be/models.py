@@ -41,3 +41,33 @@ class User(db.Model, UserMixin):
         super().__init__(**kwargs)
         if not self.fs_uniquifier:
             self.fs_uniquifier = str(uuid.uuid4())
+
+# Analyst annotations for Elasticsearch alert documents, kept in Postgres so
+# a remark or tickbox change doesn't reindex the whole alert; merged into
+# search results at read time
+class Annotation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    doc_index = db.Column(db.String(255), nullable=False)
+    doc_id = db.Column(db.String(255), nullable=False, index=True)
+    remark = db.Column(db.Text())
+    tickbox = db.Column(db.Boolean())
+    label = db.Column(db.String(20))
+    updated_at = db.Column(db.DateTime(), default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('doc_index', 'doc_id', name='uq_annotation_doc'),
+    )
+
+# Fraud rules maintained by Rule Makers. conditions holds the validated
+# [{field, op, value}] list, all of which must match for the rule to fire;
+# score is what a firing adds to the transaction's total
+class Rule(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), unique=True, nullable=False)
+    description = db.Column(db.String(255))
+    conditions = db.Column(db.JSON(), nullable=False)
+    score = db.Column(db.Integer(), nullable=False, default=1)
+    enabled = db.Column(db.Boolean(), nullable=False, default=True)
+    created_by = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime(), default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime(), default=datetime.utcnow, onupdate=datetime.utcnow)
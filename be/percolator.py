@@ -0,0 +1,135 @@
+import threading
+import time
+import numpy as np
+from elasticsearch import helpers
+from rules import RULE_FIELDS
+
+# Mapping of the rules index: the stored queries plus every field a rule
+# can test, typed the way the in-process engine compares them
+PERCOLATOR_MAPPING = {
+    "dynamic": False,  # Unmapped transaction fields are ignored while percolating
+    "properties": {
+        "query": {"type": "percolator"},
+        "rule_id": {"type": "long"},
+        "name": {"type": "keyword"},
+        "score": {"type": "integer"},
+        "Total Price": {"type": "double"},
+        "Customer ID": {"type": "keyword"},
+        "Customer Name": {"type": "keyword"},
+        "Customer Gender": {"type": "keyword"},
+        "GeoIP City Name": {"type": "keyword"},
+        "GeoIP Continent Name": {"type": "keyword"},
+        "GeoIP Country ISO Code": {"type": "keyword"},
+        "Products": {"properties": {"Product Name": {"type": "keyword"}}}
+    }
+}
+
+_RANGE_OPS = {'gt': 'gt', 'gte': 'gte', 'lt': 'lt', 'lte': 'lte'}
+
+
+def condition_query(condition):
+    # The ES query for one validated condition, with the same semantics as
+    # rules.CompiledRules: a missing field never satisfies ne/not_in,
+    # except for products, where no products means none of them match
+    field, op, value = condition['field'], condition['op'], condition['value']
+    if RULE_FIELDS[field] == 'product':
+        terms = {"terms": {"Products.Product Name": value}}
+        return terms if op == 'in' else {"bool": {"must_not": [terms]}}
+
+    if op in _RANGE_OPS:
+        return {"range": {field: {_RANGE_OPS[op]: value}}}
+    if op == 'between':
+        return {"range": {field: {"gte": value[0], "lte": value[1]}}}
+    match = {"term": {field: value}} if op in ('eq', 'ne') else {"terms": {field: value}}
+    if op in ('eq', 'in'):
+        return match
+    return {"bool": {"filter": [{"exists": {"field": field}}], "must_not": [match]}}
+
+
+def rule_query(rule):
+    return {"bool": {"filter": [condition_query(condition) for condition in rule['conditions']]}}
+
+
+class PercolatorRules:
+    # Rule engine backed by an Elasticsearch percolator index. Every enabled
+    # rule is stored as a percolator query; a batch of transactions is
+    # matched against all of them with one percolate search, and each hit
+    # names the batch slots (_percolator_document_slot) its rule fired on.
+
+    def __init__(self, es, index, batch_size, max_rules):
+        self.es = es
+        self.index = index
+        self.batch_size = batch_size
+        self.max_rules = max_rules  # Hits per percolate search, bounded by index.max_result_window
+        self._lock = threading.Lock()
+        self.rules = []
+        self.syncs = 0
+        self.batches = 0
+        self.scored = 0
+        self.total_score_seconds = 0.0
+
+    def ensure_index(self):
+        if not self.es.indices.exists(index=self.index):
+            self.es.indices.create(index=self.index, mappings=PERCOLATOR_MAPPING)
+
+    def sync(self, rules):
+        # Make the rules index hold exactly these rules
+        if len(rules) > self.max_rules:
+            raise ValueError(f"The percolator engine supports at most {self.max_rules} rules")
+        self.ensure_index()
+        helpers.bulk(self.es, (
+            {
+                '_index': self.index,
+                '_id': str(rule['id']),
+                'query': rule_query(rule),
+                'rule_id': rule['id'],
+                'name': rule['name'],
+                'score': rule['score']
+            }
+            for rule in rules
+        ))
+        # Removes rules deleted or disabled since, and the refresh makes the new ones live
+        self.es.delete_by_query(index=self.index, refresh=True, query={
+            "bool": {"must_not": [{"ids": {"values": [str(rule['id']) for rule in rules]}}]}
+        })
+        with self._lock:
+            self.rules = rules
+            self.syncs += 1
+
+    def score(self, transactions):
+        # Same contract as RuleBook.score: (engine, scores, matched rule ids per transaction)
+        scores = np.zeros(len(transactions), dtype=np.int64)
+        matched = [[] for _ in transactions]
+        for start in range(0, len(transactions), self.batch_size):
+            batch = transactions[start:start + self.batch_size]
+            started = time.monotonic()
+            res = self.es.search(index=self.index, body={
+                "query": {"percolate": {"field": "query", "documents": batch}},
+                "size": self.max_rules,
+                "sort": [{"rule_id": "asc"}],
+                "_source": ["rule_id", "score"],
+                "track_total_hits": False
+            })
+            for hit in res.get('hits', {}).get('hits', []):
+                rule = hit['_source']
+                slots = np.array(hit.get('fields', {}).get('_percolator_document_slot', []), dtype=np.intp)
+                scores[start + slots] += rule['score']
+                for slot in slots:
+                    matched[start + slot].append(rule['rule_id'])
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self.batches += 1
+                self.scored += len(batch)
+                self.total_score_seconds += elapsed
+        return self, scores, matched
+
+    def stats(self):
+        with self._lock:
+            return {
+                "index": self.index,
+                "rules": len(self.rules),
+                "syncs": self.syncs,
+                "batches": self.batches,
+                "scored_transactions": self.scored,
+                "transactions_per_second": round(self.scored / self.total_score_seconds) if self.total_score_seconds else 0
+            }
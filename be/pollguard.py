@@ -0,0 +1,149 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import Response, current_app, g, request
+
+
+def client_key():
+    # The browser session when there is one, then the auth token, then
+    # the address and user agent; hashed so no credential is kept around
+    session = request.cookies.get(current_app.config['SESSION_COOKIE_NAME'])
+    if session:
+        identity = f"session:{session}"
+    elif request.headers.get('Authentication-Token'):
+        identity = f"token:{request.headers['Authentication-Token']}"
+    else:
+        identity = f"address:{request.remote_addr}|{request.user_agent.string}"
+    return hashlib.blake2b(identity.encode('utf-8'), digest_size=12).hexdigest()
+
+
+class _Memo:
+    __slots__ = ('expires_at', 'status', 'headers', 'body', 'repeats')
+
+    def __init__(self, expires_at, status, headers, body):
+        self.expires_at = expires_at
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.repeats = 0
+
+
+class PollGuard:
+    # Protects polled GET endpoints from clients stuck in a refresh loop.
+    # The first response to a request is memoized per client for window
+    # seconds, as sent (compressed, with its ETag); identical requests from
+    # the same client inside the window get the memo back with a
+    # Retry-After hint and never reach the view. A client that repeats one
+    # request storm_repeats times within a window is flagged as offending
+    # and told to wait storm_retry_after seconds instead.
+
+    def __init__(self, endpoints, window, max_entries, max_body, storm_repeats, storm_retry_after, logger):
+        self.endpoints = set(endpoints)
+        self.window = window
+        self.max_entries = max_entries
+        self.max_body = max_body  # Larger responses are not memoized
+        self.storm_repeats = storm_repeats
+        self.storm_retry_after = storm_retry_after
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._memos = OrderedDict()  # (client, endpoint, args, headers) -> _Memo
+        self._offenders = OrderedDict()  # client -> last flagged at
+        self.checked = 0
+        self.deduplicated = 0
+        self.stored = 0
+        self.evictions = 0
+        self.offending_sessions = 0
+
+    def init_app(self, app):
+        # Register before the response compressor: after_request hooks run
+        # in reverse, so the memo holds the body as it went out
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+    @staticmethod
+    def _request_key(client):
+        return (
+            client,
+            request.endpoint,
+            tuple(sorted(request.args.items(multi=True))),
+            request.headers.get('Accept-Encoding', ''),
+            request.headers.get('If-None-Match', '')
+        )
+
+    def before_request(self):
+        if request.method != 'GET' or request.endpoint not in self.endpoints:
+            return None
+        client = client_key()
+        key = self._request_key(client)
+        now = time.monotonic()
+        flagged = False
+        with self._lock:
+            self.checked += 1
+            memo = self._memos.get(key)
+            if memo is not None and memo.expires_at <= now:
+                del self._memos[key]
+                memo = None
+            if memo is None:
+                g.poll_guard_key = key
+                return None
+
+            self.deduplicated += 1
+            memo.repeats += 1
+            if memo.repeats >= self.storm_repeats:
+                flagged = client not in self._offenders
+                if flagged:
+                    self.offending_sessions += 1
+                self._offenders[client] = now
+                self._offenders.move_to_end(client)
+                while len(self._offenders) > self.max_entries:
+                    self._offenders.popitem(last=False)
+            offending = client in self._offenders and now - self._offenders[client] < self.storm_retry_after
+            retry_after = self.storm_retry_after if offending else max(1, math.ceil(memo.expires_at - now))
+            status, headers, body = memo.status, memo.headers, memo.body
+
+        if flagged:
+            self.logger.warning(f"Client {client} repeated {request.path} {self.storm_repeats} times "
+                                f"within {self.window}s; serving it from the poll memo")
+        response = Response(body, status=status, headers=headers)
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+
+    def after_request(self, response):
+        key = g.pop('poll_guard_key', None)
+        if (key is None or response.status_code != 200 or response.direct_passthrough
+                or response.is_streamed or (response.content_length or 0) > self.max_body):
+            return response
+        body = response.get_data()
+        if len(body) > self.max_body:
+            return response
+        now = time.monotonic()
+        with self._lock:
+            self._memos[key] = _Memo(now + self.window, response.status_code, list(response.headers.items()), body)
+            self._memos.move_to_end(key)
+            self.stored += 1
+            # Memos are kept in the order they expire, so expired ones are at the front
+            while self._memos and next(iter(self._memos.values())).expires_at <= now:
+                self._memos.popitem(last=False)
+            while len(self._memos) > self.max_entries:
+                self._memos.popitem(last=False)
+                self.evictions += 1
+        return response
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "endpoints": sorted(self.endpoints),
+                "window": self.window,
+                "entries": len(self._memos),
+                "checked": self.checked,
+                "deduplicated": self.deduplicated,
+                "dedup_ratio": round(self.deduplicated / self.checked, 4) if self.checked else 0.0,
+                "stored": self.stored,
+                "evictions": self.evictions,
+                "offending_sessions": self.offending_sessions,
+                "active_offenders": sum(1 for flagged_at in self._offenders.values()
+                                        if now - flagged_at < self.storm_retry_after)
+            }
@@ -1,27 +1,490 @@
+import atexit
+import json
 import logging
-from flask import jsonify, request
+import os
+import click
+from flask import jsonify, request, Response, stream_with_context
+from flask_socketio import emit, join_room, leave_room
 from flask_security import roles_required, auth_required, current_user, logout_user, login_user
 from flask_security.utils import hash_password, send_mail
 from datetime import datetime
 import pytz
-from app import es, socketio, user_datastore, db
-from models import Role, User
-
-# Define the global variable `latest_timestamp` at the module level
-latest_timestamp = None
+from elasticsearch import NotFoundError
+from sqlalchemy import event
+from app import es, socketio, websocket_deflate, user_datastore, db
+from models import Role, User, Rule
+from catalog import IndexCatalog
+from cache import ResultCache
+from compression import ResponseCompressor
+from etags import Generations, with_etag, not_modified
+from pollguard import PollGuard
+from locator import DocLocator
+from singleflight import SingleFlight
+from changefeed import ChangeFeed
+from deltas import DeltaSequencer, RedisSequences
+from annotations import (ANNOTATION_LABELS, parse_annotation, bulk_update, upsert_annotations,
+                         merge_annotations, mirror_labels, ensure_label_mapping)
+from writebehind import WriteBehindBuffer
+from rules import parse_rule, RuleBook
+from percolator import PercolatorRules
+from ingest import iter_ndjson, prepare_alerts, index_alerts
+from backtest import BacktestRunner
+from velocity import VelocityTracker
+from subscriptions import subscription_room, updates_room, group_by_room, group_changes, backtest_room
+from transactions import (UNREVIEWED_LABEL, build_transactions_query, format_transaction, source_includes, decode_cursor,
+                          search_with_pit, seek_page, page_cursors, close_pit, iter_transactions,
+                          export_csv_header, export_csv_rows, export_ndjson_rows)
+
+# Values accepted by the `label` filter of /get_transactions and /export_transactions
+LABEL_FILTERS = ANNOTATION_LABELS + (UNREVIEWED_LABEL,)
 
 def init_routes(app):
 
+    # Per-client memo of polled responses; set up before the compressor so it keeps compressed bodies
+    poll_guard = PollGuard(
+        app.config['POLL_GUARD_ENDPOINTS'],
+        app.config['POLL_DEDUP_WINDOW'],
+        app.config['POLL_MEMO_SIZE'],
+        app.config['POLL_MEMO_MAX_BODY'],
+        app.config['POLL_STORM_REPEATS'],
+        app.config['POLL_STORM_RETRY_AFTER'],
+        app.logger
+    )
+    poll_guard.init_app(app)
+
+    # gzip/brotli for large JSON responses
+    response_compressor = ResponseCompressor(
+        app.config['COMPRESS_MIN_SIZE'],
+        app.config['COMPRESS_LEVEL'],
+        app.config['COMPRESS_BROTLI_QUALITY'],
+        app.config['COMPRESS_MIMETYPES']
+    )
+    response_compressor.init_app(app)
+
+    # Known alert indices, kept warm by a background task
+    index_catalog = IndexCatalog(
+        es,
+        app.config['ALERT_INDEX_PATTERN'],
+        app.config['INDEX_CATALOG_TTL'],
+        app.config['INDEX_CATALOG_MIN_REFRESH_INTERVAL'],
+        app.logger
+    )
+
+    # Where each document lives, learned from served hits, for routing annotation writes
+    doc_locator = DocLocator(es, app.config['ALERT_INDEX_PATTERN'], app.config['DOC_LOCATOR_SIZE'])
+
+    # Short-lived cache of /get_transactions responses for identical dashboard refreshes
+    result_cache = ResultCache(app.config['RESULT_CACHE_SIZE'], app.config['RESULT_CACHE_TTL'])
+    index_catalog.on_change(lambda added: result_cache.invalidate())
+
+    # Versions behind the ETags of conditional GETs, bumped wherever the
+    # result cache is invalidated
+    generations = Generations(app.config['ETAG_MAX_AGE'])
+    index_catalog.on_change(lambda added: generations.bump_all())
+
+    # Any flush touching users or roles, including Flask-Security's own
+    # (registration, login tracking), changes what /get_users and /get_roles serve
+    @event.listens_for(db.session, 'after_flush')
+    def note_user_changes(session, flush_context):
+        if any(isinstance(obj, (User, Role)) for obj in (*session.new, *session.dirty, *session.deleted)):
+            session.info['users_changed'] = True
+
+    @event.listens_for(db.session, 'after_commit')
+    def bump_users(session):
+        if session.info.pop('users_changed', False):
+            generations.bump(['users'])
+
+    @event.listens_for(db.session, 'after_rollback')
+    def forget_user_changes(session):
+        session.info.pop('users_changed', None)
+
+    def map_labels(added):
+        # New alert indices need the keyword `label` field before anyone filters on it
+        try:
+            ensure_label_mapping(es, app.config['ALERT_INDEX_PATTERN'])
+        except Exception as e:
+            app.logger.error(f"Error mapping label field: {e}")
+
+    index_catalog.on_change(map_labels)
+
+    # Coalesces identical concurrent searches that miss the result cache
+    search_flight = SingleFlight(socketio.server.eio.create_event, app.config['SEARCH_COALESCE_TIMEOUT'])
+
+    # Background tail of every alert index; pushes new alerts to the browsers
+    change_feed = ChangeFeed(
+        es,
+        index_catalog,
+        app.config['CHANGE_FEED_INTERVAL'],
+        app.config['CHANGE_FEED_BATCH_SIZE'],
+        app.logger
+    )
+
+    # Sequence numbers for the live deltas pushed to each index's rooms
+    delta_sequencer = DeltaSequencer(
+        app.config['DELTA_MAX_ROOMS'],
+        app.config['DELTA_REPLAY_SIZE'],
+        RedisSequences(app.config['DELTA_SEQUENCE_URL'], app.config['SOCKETIO_CHANNEL'])
+        if app.config['DELTA_SEQUENCE_URL'] else None
+    )
+
+    # Per-customer order velocity, fed by every new alert the app sees
+    velocity_tracker = VelocityTracker(
+        app.config['VELOCITY_WINDOWS'],
+        app.config['VELOCITY_BUCKET_SECONDS'],
+        app.config['VELOCITY_MAX_CUSTOMERS']
+    )
+
+    def warm_up_velocity():
+        try:
+            velocity_tracker.warm_up(es, app.config['ALERT_INDEX_PATTERN'],
+                                     app.config['EXPORT_BATCH_SIZE'], app.config['PIT_KEEP_ALIVE'])
+            app.logger.info(f"Velocity warm-up loaded {velocity_tracker.stats()['customers']} customers")
+        except Exception as e:
+            app.logger.error(f"Error warming up velocity features: {e}")
+
+
+    def send_delta(room, payload):
+        socketio.emit('transactions_delta', payload, to=room)
+
+    def publish_new_alerts(index, hits):
+        doc_locator.learn(hits)
+        velocity_tracker.record_hits(hits)
+        for name in index_catalog.names_for(index):
+            result_cache.invalidate(name)
+        generations.bump(index_catalog.names_for(index))
+        transactions = velocity_tracker.attach(
+            [format_transaction(hit) for hit in reversed(hits)]  # Newest first, like the table
+        )
+        # Each subscription room only receives the alerts matching its filters
+        room_deltas = [
+            (room, {'inserted': room_transactions})
+            for room, room_transactions in group_by_room(index, transactions).items()
+        ]
+        delta_sequencer.publish(index, room_deltas, send_delta)
+
+    change_feed.on_new(publish_new_alerts)
+
+    # (subscription room, updates room) of each socket's subscriptions, so
+    # 'unsubscribe' and disconnects can leave them again
+    socket_subscriptions = {}
+
+    @socketio.on('subscribe')
+    def on_subscribe(data):
+        data = data if isinstance(data, dict) else {}
+        index = data.get('index')
+        if not index or not index_catalog.exists(index):
+            emit('subscription_error', {'error': f"Index '{index}' does not exist."})
+            return
+        # Deltas go to the rooms of the concrete index a hit came from, so
+        # subscribers to an alias or a pattern would never receive any
+        if not index_catalog.is_concrete(index):
+            emit('subscription_error', {'error': f"'{index}' is not an alert index; subscribe to one of /get_indices."})
+            return
+
+        label = data.get('label')
+        if label and label not in LABEL_FILTERS:
+            emit('subscription_error', {'error': f"Unknown label '{label}'"})
+            return
+
+        sid = request.sid
+        room = subscription_room(index, data.get('customer_id'), data.get('order_id'))
+        updates = updates_room(index, label)
+        rooms = {room, updates}
+
+        def join():
+            for name in rooms:
+                join_room(name, sid=sid)
+            socket_subscriptions.setdefault(sid, set()).add((room, updates))
+
+        # A reconnecting client says where it left off and is sent only the gap
+        since = data.get('since')
+        if since:
+            try:
+                epoch, since_seq = since['epoch'], int(since.get('seq', 0))
+                valid = isinstance(epoch, str) and since_seq >= 0
+            except (AttributeError, KeyError, TypeError, ValueError, OverflowError):
+                valid = False
+            if valid:
+                replayed = delta_sequencer.replay(
+                    index, rooms, epoch, since_seq,
+                    lambda replay_room, payload: socketio.emit('transactions_delta', payload, to=sid),
+                    join=join
+                )
+            else:
+                # A position we can't read is as good as none: refetch
+                join()
+                replayed = False
+            if not replayed:
+                app.logger.debug(f"Socket {sid} missed more than the replay buffer holds for '{index}'")
+                emit('resync_required', {'index': index})
+        else:
+            join()
+
+        app.logger.debug(f"Socket {sid} subscribed to {room}")
+        emit('subscribed', {'index': index, 'room': room})
+
+    @socketio.on('unsubscribe')
+    def on_unsubscribe(data):
+        index = (data or {}).get('index')
+        if not index:
+            return
+
+        room = subscription_room(index, data.get('customer_id'), data.get('order_id'))
+        updates = updates_room(index, data.get('label'))
+        subscriptions = socket_subscriptions.get(request.sid, set())
+        subscriptions.discard((room, updates))
+        # Keep either room while another subscription still uses it
+        if not any(room == other_room for other_room, _ in subscriptions):
+            leave_room(room)
+        if not any(updates == other_updates for _, other_updates in subscriptions):
+            leave_room(updates)
+        app.logger.debug(f"Socket {request.sid} unsubscribed from {room}")
+
+    @socketio.on('disconnect')
+    def on_disconnect():
+        # Flask-SocketIO drops the room memberships itself
+        socket_subscriptions.pop(request.sid, None)
+
+    def publish_changes(index, changes):
+        # One delta per updates room carrying every [{'id', 'fields'}] change for the index
+        generations.bump(index_catalog.names_for(index))
+        delta_sequencer.publish(index, group_changes(index, changes, LABEL_FILTERS), send_delta)
+
+    def store_annotations(updates):
+        # Write [(index, id, fields)] to the configured annotation store; returns [(ok, error)]
+        chunk_size = app.config['BULK_ANNOTATE_CHUNK_SIZE']
+        if app.config['ANNOTATION_STORE'] == 'sql':
+            with app.app_context():
+                stored = upsert_annotations(db.session, updates)
+            # Labels are also mirrored into Elasticsearch so they can be filtered on
+            mirrored = mirror_labels(es, updates, chunk_size)
+            return [mirror if ok else (ok, error) for (ok, error), mirror in zip(stored, mirrored)]
+        return bulk_update(es, updates, chunk_size)
+
+    def with_annotations(transactions):
+        # Sidecar annotations are merged in at read time; the 'es' store keeps them in _source
+        if app.config['ANNOTATION_STORE'] == 'sql':
+            return merge_annotations(transactions)
+        return transactions
+
+    # Single-document annotation writes are acknowledged from memory and
+    # flushed to Elasticsearch in _bulk batches
+    annotation_buffer = WriteBehindBuffer(
+        store_annotations,
+        socketio.server.eio.create_event,
+        app.config['WRITE_BEHIND_FLUSH_INTERVAL_MS'] / 1000.0,
+        app.config['WRITE_BEHIND_MAX_OPERATIONS'],
+        app.logger
+    )
+
+    def publish_flushed(updates, outcomes):
+        changes = {}
+        for (index, doc_id, fields), (ok, error) in zip(updates, outcomes):
+            if ok:
+                changes.setdefault(index, []).append({'id': doc_id, 'fields': fields})
+            else:
+                doc_locator.forget(doc_id)  # The document may have moved or been deleted
+        if changes:
+            result_cache.invalidate()
+            for index, index_changes in changes.items():
+                publish_changes(index, index_changes)
+
+    annotation_buffer.on_flushed(publish_flushed)
+    atexit.register(annotation_buffer.flush)  # Best effort for writes acknowledged on enqueue
+
+    def write_annotation(index, doc_id, fields):
+        # With ack-on-flush durability, block until the batch holding this write is in Elasticsearch
+        wait = app.config['ANNOTATION_DURABILITY'] == 'flush'
+        waiter = annotation_buffer.enqueue(index, doc_id, fields, wait=wait)
+        if waiter is None:
+            return True, None
+        ok = waiter.wait(app.config['WRITE_BEHIND_ACK_TIMEOUT'])
+        return ok, waiter.error
+
+    def serves(index):
+        # A concrete alert index. exists() alone also accepts any other index
+        # in the cluster, and annotations must be stored under the index the
+        # hits come from, never an alias of it.
+        return bool(index) and index_catalog.exists(index) and index_catalog.is_concrete(index)
+
+    def resolve_index(doc_id, hint=None):
+        # Trust the client's index only if it is an alert index; aliases and
+        # anything else are resolved by the locator
+        if serves(hint):
+            return hint
+        return doc_locator.locate(doc_id)
+
+    def annotation_status():
+        return "success" if app.config['ANNOTATION_DURABILITY'] == 'flush' else "queued"
+
+    # Compiled enabled rules used to score incoming transactions
+    rule_book = RuleBook(app.config['RULE_EVAL_BATCH_SIZE'])
+
+    def serialize_rule(rule):
+        return {
+            'id': rule.id,
+            'name': rule.name,
+            'description': rule.description,
+            'conditions': rule.conditions,
+            'score': rule.score,
+            'enabled': rule.enabled,
+            'created_by': rule.created_by,
+            'created_at': rule.created_at,
+            'updated_at': rule.updated_at
+        }
+
+    # The same rules as percolator queries, for RULE_ENGINE = 'percolator'
+    percolator_rules = PercolatorRules(
+        es,
+        app.config['RULES_PERCOLATOR_INDEX'],
+        app.config['PERCOLATOR_BATCH_SIZE'],
+        app.config['PERCOLATOR_MAX_RULES']
+    )
+
+    def load_rules(sync_percolator=True):
+        with app.app_context():
+            rules = [serialize_rule(rule) for rule in Rule.query.filter_by(enabled=True).order_by(Rule.id).all()]
+        rule_book.load(rules)
+        app.logger.debug(f"Compiled {len(rules)} rules")
+        # The rules index is shared by every worker, so it only needs
+        # rewriting after a change or on a worker's first load
+        if sync_percolator and app.config['RULE_ENGINE'] == 'percolator':
+            try:
+                percolator_rules.sync(rules)
+            except Exception as e:
+                app.logger.error(f"Error syncing rules to '{percolator_rules.index}': {e}")
+
+    def active_rules():
+        # Recompile now and then so edits made through another worker apply here too
+        age = rule_book.age()
+        if age is None or age > app.config['RULES_RELOAD_INTERVAL']:
+            try:
+                load_rules(sync_percolator=age is None)
+            except Exception as e:
+                app.logger.error(f"Error loading rules: {e}")
+        if app.config['RULE_ENGINE'] == 'percolator':
+            return percolator_rules
+        return rule_book
+
+    def ingest_lines(lines, publish=True):
+        # Score, route and index NDJSON transactions batch by batch. With
+        # publish, each batch's alerts are pushed to subscribers as soon as
+        # they are written; otherwise the change feed picks them up.
+        summary = {"ingested": 0, "failed": 0, "indices": {}, "errors": []}
+
+        def report(line, error):
+            summary["failed"] += 1
+            if len(summary["errors"]) < app.config['INGEST_MAX_ERRORS']:
+                summary["errors"].append({"line": line, "error": error})
+
+        def process(line_numbers, transactions):
+            actions = prepare_alerts(
+                active_rules(),
+                transactions,
+                app.config['INGEST_ALERT_INDICES'],
+                app.config['INGEST_MED_SCORE'],
+                app.config['INGEST_HIGH_SCORE'],
+                datetime.utcnow().isoformat()
+            )
+            # Ids are handed to the change feed chunk by chunk as the results
+            # stream in, since a refresh can make early chunks searchable
+            # before the last one is written
+            on_chunk = change_feed.mark_delivered if publish else None
+            indexed, failures = index_alerts(es, actions, app.config['INGEST_BULK_CHUNK_SIZE'],
+                                             app.config['INGEST_BULK_THREADS'], on_chunk)
+            for position, error in failures:
+                report(line_numbers[position], error)
+
+            # A first write may have created an alert index; let the catalog map it
+            if set(indexed) - set(index_catalog.indices()):
+                try:
+                    index_catalog.refresh()
+                except Exception as e:
+                    app.logger.error(f"Error refreshing index catalog after ingest: {e}")
+
+            for index, hits in indexed.items():
+                summary["ingested"] += len(hits)
+                summary["indices"][index] = summary["indices"].get(index, 0) + len(hits)
+                if publish:
+                    publish_new_alerts(index, hits)
+
+        line_numbers = []
+        transactions = []
+        for number, transaction, error in iter_ndjson(lines):
+            if error:
+                report(number, error)
+                continue
+            line_numbers.append(number)
+            transactions.append(transaction)
+            if len(transactions) >= app.config['INGEST_BATCH_SIZE']:
+                process(line_numbers, transactions)
+                line_numbers = []
+                transactions = []
+        if transactions:
+            process(line_numbers, transactions)
+        return summary
+
+    # Background rule backtests over the historical alerts
+    backtest_runner = BacktestRunner(
+        es,
+        app.config['BACKTEST_WORKERS'] or os.cpu_count(),
+        app.config['BACKTEST_BATCH_SIZE'],
+        app.config['PIT_KEEP_ALIVE'],
+        app.config['BACKTEST_PROGRESS_INTERVAL'],
+        app.config['BACKTEST_MAX_JOBS'],
+        app.logger
+    )
+    atexit.register(backtest_runner.shutdown)
+
+    def backtest_rules(data):
+        # Stored rules by id, enabled or not, plus inline drafts that were never saved
+        rule_ids = data.get('rule_ids') or []
+        drafts = data.get('rules') or []
+        if not isinstance(rule_ids, list) or not isinstance(drafts, list):
+            raise ValueError("rule_ids and rules must be lists")
+
+        rules = []
+        if rule_ids:
+            stored = {rule.id: rule for rule in Rule.query.filter(Rule.id.in_(rule_ids)).all()}
+            missing = [rule_id for rule_id in rule_ids if rule_id not in stored]
+            if missing:
+                raise ValueError(f"Unknown rule ids: {missing}")
+            rules += [
+                {'id': rule.id, 'name': rule.name, 'score': rule.score, 'conditions': rule.conditions}
+                for rule in (stored[rule_id] for rule_id in rule_ids)
+            ]
+        for position, draft in enumerate(drafts, 1):
+            rules.append(dict(parse_rule(draft), id=f"draft-{position}"))
+
+        if not rules:
+            raise ValueError("rule_ids or rules is required")
+        return rules
+
+    def send_backtest_progress(report):
+        event = 'backtest_done' if report['state'] in ('done', 'failed') else 'backtest_progress'
+        socketio.emit(event, report, to=backtest_room(report['job_id']))
+
+    @socketio.on('watch_backtest')
+    def on_watch_backtest(data):
+        job = backtest_runner.get((data or {}).get('job_id'))
+        if job is None:
+            emit('backtest_error', {'error': "Backtest not found"})
+            return
+        join_room(backtest_room(job.id))
+        # Whatever was reported before the client joined
+        emit('backtest_progress', job.report())
+
     @app.route('/get_transactions', methods=['GET'])
     def get_transactions():
-        global latest_timestamp
-
         app.logger.info("Processing /get_transactions request")
 
+        cursor_state = None
         try:
             # Retrieve query parameters with default values
             index = request.args.get('index', 'default_index')
             page = int(request.args.get('page', 1))
+            cursor = request.args.get('cursor', None)
+            pagination = request.args.get('pagination', 'page')
 
             # Check if the size parameter is 'all' and set size accordingly
             size_param = request.args.get('size', '10')
@@ -33,105 +496,277 @@ def init_routes(app):
             from_index = (page - 1) * size
             order_id = request.args.get('order_id', None)
             customer_id = request.args.get('customer_id', None)
+            label = request.args.get('label', None)
+            view = request.args.get('view', None)
+            fields = request.args.get('fields', None)
             current_date = datetime.utcnow().isoformat()
-
-            app.logger.debug(f"Index: {index}, Page: {page}, Size: {size}, From: {from_index}")
-
-            # Check if the index exists in Elasticsearch
-            if not es.indices.exists(index=index):
+            keep_alive = app.config['PIT_KEEP_ALIVE']
+
+            if label and label not in LABEL_FILTERS:
+                return jsonify({"error": f"Unknown label '{label}'"}), 400
+
+            # view=summary or fields=a,b,c trim each hit's _source to what the table shows
+            try:
+                source = source_includes(view, fields)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            if cursor:
+                try:
+                    cursor_state = decode_cursor(cursor)
+                except ValueError as e:
+                    app.logger.warning(f"Rejected cursor: {e}")
+                    return jsonify({"error": "Invalid cursor"}), 400
+                # Keep the upper bound the cursor was opened with so pages stay consistent
+                current_date = cursor_state['as_of']
+                page = cursor_state['page']
+
+            app.logger.debug(f"Index: {index}, Page: {page}, Size: {size}, From: {from_index}, Cursor: {bool(cursor)}")
+
+            # Check the index against the catalog instead of asking Elasticsearch
+            if not index_catalog.exists(index):
                 app.logger.warning(f"Index '{index}' does not exist.")
                 return jsonify({"error": f"Index '{index}' does not exist."}), 404
 
-            # Construct the base query to fetch transactions
-            query = {
-                "query": {
-                    "bool": {
-                        "must": [
-                            {
-                                "range": {
-                                    "@timestamp": {
-                                        "lte": current_date
-                                    }
-                                }
-                            }
-                        ]
-                    }
-                },
-                "size": size,
-                "from": from_index,
-                "sort": [
-                    {"@timestamp": "desc"}  # Sort by timestamp descending
-                ]
-            }
+            cache_key = ResultCache.make_key(
+                index, page=None if cursor else page, cursor=cursor, size=size,
+                pagination=pagination, order_id=order_id, customer_id=customer_id, label=label,
+                source=None if source is True else ','.join(source)
+            )
+
+            # Nothing has changed since the client's copy: no search at all
+            def current_etag():
+                return generations.etag(index, tracked=index_catalog.tracks(index), variant=repr(cache_key))
+
+            etag = current_etag()
+            held = generations.match(request.if_none_match, etag)
+            if held:
+                app.logger.debug("Answering /get_transactions with 304 Not Modified")
+                return not_modified(held)
+
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                app.logger.debug("Serving /get_transactions from the result cache")
+                etag, payload = cached
+                return with_etag(jsonify(payload), etag)
+
+            def run_search():
+                # Read before searching: deltas issued after this point may overlap
+                # the page, which clients tolerate by de-duplicating on id. The
+                # same goes for the ETag, which then only errs towards a refetch.
+                epoch, seq = delta_sequencer.position(index)
+                etag = current_etag()
+
+                query = build_transactions_query(current_date, order_id, customer_id, label)
+                app.logger.debug(f"Elasticsearch query: {query}")
+
+                pit_id = None
+                if cursor_state:
+                    # Continue from the cursor inside its point-in-time
+                    res, transactions = search_with_pit(
+                        es, query, size, cursor_state['pit'], keep_alive,
+                        search_after=cursor_state['after'],
+                        reverse=cursor_state['dir'] == 'prev',
+                        source=source
+                    )
+                    pit_id = res.get('pit_id', cursor_state['pit'])
+                elif pagination == 'cursor' or from_index + size > app.config['DEEP_PAGE_THRESHOLD']:
+                    # Open a point-in-time and seek with search_after; pages past the
+                    # from/size window land here transparently and get cursors back
+                    app.logger.debug(f"Serving page {page} with search_after over a point-in-time")
+                    res, transactions, pit_id = seek_page(
+                        es, index, query, page, size, keep_alive, app.config['DEEP_PAGE_BATCH_SIZE'],
+                        source=source
+                    )
+                else:
+                    # Execute the query against Elasticsearch
+                    res = es.search(index=index, body={
+                        "query": query,
+                        "size": size,
+                        "from": from_index,
+                        "sort": [
+                            {"@timestamp": "desc"}  # Sort by timestamp descending
+                        ],
+                        "_source": source
+                    })
+                    transactions = res.get('hits', {}).get('hits', [])
+
+                app.logger.debug(f"Number of transactions fetched: {len(transactions)}")
+                doc_locator.learn(transactions)
+
+                # Format the fetched transactions; velocity features come from memory
+                formatted_transactions = velocity_tracker.attach(with_annotations(
+                    [format_transaction(transaction) for transaction in transactions]
+                ))
+
+                next_cursor, prev_cursor = None, None
+                if pit_id:
+                    next_cursor, prev_cursor = page_cursors(transactions, size, pit_id, current_date, page)
+                    if not next_cursor and not prev_cursor:
+                        # Nothing can continue from this page, so don't pin its segments until keep_alive
+                        close_pit(es, pit_id)
+
+                # Add the total count of transactions in the response
+                payload = {
+                    "total": res.get('hits', {}).get('total', {}).get('value', 0),
+                    "transactions": formatted_transactions,
+                    "page": page,
+                    "next_cursor": next_cursor,
+                    "prev_cursor": prev_cursor,
+                    "epoch": epoch,
+                    "seq": seq
+                }
+                if size <= app.config['RESULT_CACHE_MAX_ROWS']:
+                    result_cache.put(cache_key, (etag, payload))
+                return etag, payload
+
+            # Identical concurrent requests share a single Elasticsearch round trip
+            etag, payload = search_flight.do(cache_key, run_search)
 
-            # Add filtering by order_id if provided
-            if order_id:
-                query["query"]["bool"]["must"].append({
-                    "term": {"Order ID.keyword": order_id}  # Adjust to match Elasticsearch field
-                })
+            app.logger.info("Successfully processed /get_transactions request")
 
-            # Add filtering by customer_id if provided
-            if customer_id:
-                query["query"]["bool"]["must"].append({
-                    "term": {"Customer ID.keyword": customer_id}  # Adjust to match Elasticsearch field
-                })
+            return with_etag(jsonify(payload), etag)
+        except NotFoundError:
+            if cursor_state:
+                app.logger.warning("Point-in-time behind cursor has expired")
+                return jsonify({"error": "Cursor has expired, reload from the first page"}), 410
+            # The catalog was out of date (index deleted or rolled away)
+            app.logger.warning(f"Index '{index}' disappeared, invalidating index catalog")
+            index_catalog.invalidate(index)
+            return jsonify({"error": f"Index '{index}' does not exist."}), 404
+        except Exception as e:
+            app.logger.error(f"Error fetching transactions: {e}")
+            return jsonify({"error": "Failed to fetch transactions"}), 500
 
-            app.logger.debug(f"Elasticsearch query: {query}")
 
-            # Execute the query against Elasticsearch
-            res = es.search(index=index, body=query)
-            transactions = res.get('hits', {}).get('hits', [])
+    @app.route('/get_transaction/<index>/<doc_id>', methods=['GET'])
+    def get_transaction(index, doc_id):
+        # The whole document behind one row, fetched when the row is expanded
+        app.logger.info("Processing /get_transaction request")
+        try:
+            if not index_catalog.exists(index):
+                return jsonify({"error": f"Index '{index}' does not exist."}), 404
 
-            app.logger.debug(f"Number of transactions fetched: {len(transactions)}")
+            hit = es.get(index=index, id=doc_id)
+            doc_locator.remember(hit['_id'], hit['_index'])
+            transaction = velocity_tracker.attach(with_annotations([format_transaction(hit)]))[0]
+            return jsonify({"transaction": transaction}), 200
 
-            # Format the fetched transactions
-            formatted_transactions = []
-            for transaction in transactions:
-                source = transaction.get('_source', {})
-                utc_timestamp = source.get('@timestamp')
+        except NotFoundError:
+            return jsonify({"error": "Transaction not found"}), 404
+        except Exception as e:
+            app.logger.error(f"Error fetching transaction: {e}")
+            return jsonify({"error": "Failed to fetch transaction"}), 500
+
+    @app.route('/get_transactions_batch', methods=['POST'])
+    def get_transactions_batch():
+        # Whole documents for several rows with one _mget; entries without an
+        # index are routed through the document locator
+        app.logger.info("Processing /get_transactions_batch request")
+        try:
+            docs = (request.json or {}).get('docs')
+            if not isinstance(docs, list) or not docs or not all(isinstance(d, dict) and d.get('id') for d in docs):
+                return jsonify({"error": "docs must be a non-empty list of {id, index?}"}), 400
+            if len(docs) > app.config['MGET_MAX_DOCS']:
+                return jsonify({"error": f"At most {app.config['MGET_MAX_DOCS']} documents per request"}), 400
+
+            routed = {d['id']: d['index'] for d in docs if d.get('index') and index_catalog.exists(d['index'])}
+            unrouted = [d['id'] for d in docs if d['id'] not in routed]
+            if unrouted:
+                routed.update(doc_locator.locate_many(unrouted))
+            requested = [{'_index': routed[d['id']], '_id': d['id']} for d in docs if d['id'] in routed]
+            missing = [d['id'] for d in docs if d['id'] not in routed]
+
+            found = []
+            if requested:
+                res = es.mget(docs=requested)
+                for hit in res.get('docs', []):
+                    if hit.get('found'):
+                        found.append(hit)
+                    else:
+                        missing.append(hit.get('_id'))
+            doc_locator.learn(found)
+
+            transactions = velocity_tracker.attach(with_annotations([format_transaction(hit) for hit in found]))
+            return jsonify({"transactions": transactions, "missing": missing}), 200
 
-                # Append formatted transaction data
-                formatted_transactions.append({
-                    'id': transaction.get('_id', 'N/A'),
-                    'timestamp': utc_timestamp if utc_timestamp else 'N/A',
-                    'data': source,  # Include all data here
-                    'tickbox': source.get('tickbox', False),
-                    'remark': source.get('remark', '')
-                })
+        except Exception as e:
+            app.logger.error(f"Error fetching transactions batch: {e}")
+            return jsonify({"error": "Failed to fetch transactions"}), 500
 
-            # Check if there is new data based on the timestamp
-            new_timestamp = formatted_transactions[0]['timestamp'] if formatted_transactions else None
-            if new_timestamp and (not latest_timestamp or new_timestamp > latest_timestamp):
-                latest_timestamp = new_timestamp
-                socketio.emit('new_data_available', {'message': 'New data available'})
+    @app.route('/export_transactions', methods=['GET'])
+    def export_transactions():
+        app.logger.info("Processing /export_transactions request")
 
-            app.logger.info("Successfully processed /get_transactions request")
+        try:
+            index = request.args.get('index', 'default_index')
+            export_format = request.args.get('format', 'ndjson')
+            order_id = request.args.get('order_id', None)
+            customer_id = request.args.get('customer_id', None)
+            label = request.args.get('label', None)
+            current_date = datetime.utcnow().isoformat()
 
-            # Add the total count of transactions in the response
-            return jsonify({
-                "total": res.get('hits', {}).get('total', {}).get('value', 0),
-                "transactions": formatted_transactions
-            })
-        except Exception as e:
-            app.logger.error(f"Error fetching transactions: {e}")
-            return jsonify({"error": "Failed to fetch transactions"}), 500
+            if export_format not in ('ndjson', 'csv'):
+                return jsonify({"error": "Unsupported export format"}), 400
+            if label and label not in LABEL_FILTERS:
+                return jsonify({"error": f"Unknown label '{label}'"}), 400
 
+            if not index_catalog.exists(index):
+                app.logger.warning(f"Index '{index}' does not exist.")
+                return jsonify({"error": f"Index '{index}' does not exist."}), 404
+
+            query = build_transactions_query(current_date, order_id, customer_id, label)
+            app.logger.debug(f"Export query: {query}, Format: {export_format}")
+
+            batch_size = app.config['EXPORT_BATCH_SIZE']
+            keep_alive = app.config['PIT_KEEP_ALIVE']
+
+            def generate():
+                exported = 0
+                try:
+                    if export_format == 'csv':
+                        yield export_csv_header()
+                    # One PIT batch is formatted and flushed to the client at a time
+                    for hits in iter_transactions(es, index, query, batch_size, keep_alive):
+                        exported += len(hits)
+                        rows = with_annotations([format_transaction(hit) for hit in hits])
+                        yield export_csv_rows(rows) if export_format == 'csv' else export_ndjson_rows(rows)
+                    app.logger.info(f"Exported {exported} transactions from '{index}'")
+                except Exception as e:
+                    # Headers are already sent, so the truncated body is all we can signal
+                    app.logger.error(f"Error exporting transactions after {exported} rows: {e}")
+
+            if export_format == 'csv':
+                mimetype = 'text/csv'
+                filename = f"{index}.csv"
+            else:
+                mimetype = 'application/x-ndjson'
+                filename = f"{index}.ndjson"
+
+            return Response(
+                stream_with_context(generate()),
+                mimetype=mimetype,
+                headers={"Content-Disposition": f"attachment; filename={filename}"}
+            )
+        except Exception as e:
+            app.logger.error(f"Error exporting transactions: {e}")
+            return jsonify({"error": "Failed to export transactions"}), 500
 
     @app.route('/get_indices', methods=['GET'])
     def get_indices():
         app.logger.info("Processing /get_indices request")
         try:
-            # Define the pattern or list of indices to fetch
-            selected_index_pattern = "low-alert*,med-alert*,high-alert*"  # Use patterns or specific indices
-
-            # Fetch only the indices matching the pattern
-            indices = es.indices.get_alias(index=selected_index_pattern)
-            index_list = list(indices.keys())
+            # Served from the index catalog, refreshed in the background
+            index_list = index_catalog.indices()
 
             # Log the fetched indices
             app.logger.debug(f"Fetched indices: {index_list}")
 
-            return jsonify({"indices": index_list}), 200
+            etag = generations.etag('indices', variant=','.join(index_list))
+            held = generations.match(request.if_none_match, etag)
+            if held:
+                return not_modified(held)
+            return with_etag(jsonify({"indices": index_list}), etag), 200
 
         except NotFoundError as e:
             # More specific error handling for index not found
@@ -156,12 +791,17 @@ def init_routes(app):
 
             app.logger.debug(f"Document ID: {doc_id}, Remark: {remark}")
 
-            es.update(index='test', id=doc_id, body={"doc": {"remark": remark}})
-            socketio.emit('transaction_updated', {'id': doc_id, 'remark': remark})
+            index = resolve_index(doc_id, data.get('index'))
+            if not index:
+                return jsonify({"error": "Transaction not found"}), 404
+
+            ok, error = write_annotation(index, doc_id, {'remark': remark})
+            if not ok:
+                raise RuntimeError(error)
 
             app.logger.info("Successfully saved remark")
 
-            return jsonify({"status": "success"})
+            return jsonify({"status": annotation_status()})
 
         except Exception as e:
             app.logger.error(f"Error saving remark: {e}")
@@ -181,17 +821,309 @@ def init_routes(app):
 
             app.logger.debug(f"Document ID: {doc_id}, Tickbox: {tickbox}")
 
-            es.update(index='test', id=doc_id, body={"doc": {"tickbox": tickbox}})
-            socketio.emit('transaction_updated', {'id': doc_id, 'tickbox': tickbox})
+            index = resolve_index(doc_id, data.get('index'))
+            if not index:
+                return jsonify({"error": "Transaction not found"}), 404
+
+            ok, error = write_annotation(index, doc_id, {'tickbox': tickbox})
+            if not ok:
+                raise RuntimeError(error)
 
             app.logger.info("Successfully toggled tickbox")
 
-            return jsonify({"status": "success"})
+            return jsonify({"status": annotation_status()})
 
         except Exception as e:
             app.logger.error(f"Error toggling tickbox: {e}")
             return jsonify({"error": "Failed to toggle tickbox"}), 500
 
+    @app.route('/set_label', methods=['POST'])
+    @auth_required()
+    def set_label():
+        app.logger.info("Processing /set_label request")
+        try:
+            data = request.json
+            doc_id = data.get('id')
+            label = data.get('label')
+
+            # A null label clears the review back to unreviewed
+            if not doc_id or (label is not None and label not in ANNOTATION_LABELS):
+                return jsonify({"error": "Invalid data provided"}), 400
+
+            app.logger.debug(f"Document ID: {doc_id}, Label: {label}")
+
+            index = resolve_index(doc_id, data.get('index'))
+            if not index:
+                return jsonify({"error": "Transaction not found"}), 404
+
+            ok, error = write_annotation(index, doc_id, {'label': label})
+            if not ok:
+                raise RuntimeError(error)
+
+            app.logger.info("Successfully set label")
+
+            return jsonify({"status": annotation_status()})
+
+        except Exception as e:
+            app.logger.error(f"Error setting label: {e}")
+            return jsonify({"error": "Failed to set label"}), 500
+
+    @app.route('/bulk_annotate', methods=['POST'])
+    @auth_required()
+    def bulk_annotate():
+        app.logger.info("Processing /bulk_annotate request")
+        try:
+            data = request.json
+            operations = data.get('operations') if isinstance(data, dict) else None
+
+            if not isinstance(operations, list) or not operations:
+                return jsonify({"error": "Invalid data provided"}), 400
+            if len(operations) > app.config['BULK_ANNOTATE_MAX_OPERATIONS']:
+                return jsonify({"error": f"At most {app.config['BULK_ANNOTATE_MAX_OPERATIONS']} operations per request"}), 400
+
+            # Invalid operations are reported per item and never sent to Elasticsearch
+            results = [None] * len(operations)
+            updates = []
+            positions = []
+            for position, operation in enumerate(operations):
+                try:
+                    updates.append(parse_annotation(operation))
+                    positions.append(position)
+                except ValueError as e:
+                    results[position] = {
+                        "id": operation.get('id') if isinstance(operation, dict) else None,
+                        "status": "invalid",
+                        "error": str(e)
+                    }
+
+            # Operations without a concrete alert index are routed with a single locator lookup
+            unrouted = [doc_id for index, doc_id, fields in updates if not serves(index)]
+            located = doc_locator.locate_many(unrouted) if unrouted else {}
+            routed_updates = []
+            routed_positions = []
+            for position, (index, doc_id, fields) in zip(positions, updates):
+                index = index if serves(index) else located.get(doc_id)
+                if index:
+                    routed_updates.append((index, doc_id, fields))
+                    routed_positions.append(position)
+                else:
+                    results[position] = {"id": doc_id, "status": "failed", "error": "Transaction not found"}
+            updates, positions = routed_updates, routed_positions
+
+            app.logger.debug(f"Bulk annotating {len(updates)} documents, {len(operations) - len(updates)} invalid or not found")
+
+            changes = {}
+            outcomes = store_annotations(updates) if updates else []
+            for position, (index, doc_id, fields), (ok, error) in zip(positions, updates, outcomes):
+                if ok:
+                    results[position] = {"id": doc_id, "index": index, "status": "updated"}
+                    changes.setdefault(index, []).append({'id': doc_id, 'fields': fields})
+                else:
+                    doc_locator.forget(doc_id)
+                    results[position] = {"id": doc_id, "index": index, "status": "failed", "error": str(error)}
+
+            if changes:
+                result_cache.invalidate()
+                # One coalesced delta per index instead of one frame per document
+                for index, index_changes in changes.items():
+                    publish_changes(index, index_changes)
+
+            updated = sum(len(index_changes) for index_changes in changes.values())
+            app.logger.info(f"Bulk annotation updated {updated} of {len(operations)} documents")
+
+            return jsonify({
+                "updated": updated,
+                "failed": len(operations) - updated,
+                "results": results
+            })
+
+        except Exception as e:
+            app.logger.error(f"Error in bulk annotation: {e}")
+            return jsonify({"error": "Failed to annotate transactions"}), 500
+
+    @app.route('/get_rules', methods=['GET'])
+    @roles_required('Rule Maker')
+    def get_rules():
+        app.logger.info("Processing /get_rules request")
+        try:
+            rules = [serialize_rule(rule) for rule in Rule.query.order_by(Rule.id).all()]
+            return jsonify({"rules": rules}), 200
+        except Exception as e:
+            app.logger.error(f"Error fetching rules: {e}")
+            return jsonify({"error": "Failed to fetch rules"}), 500
+
+    @app.route('/create_rule', methods=['POST'])
+    @roles_required('Rule Maker')
+    def create_rule():
+        app.logger.info("Processing /create_rule request")
+        try:
+            try:
+                fields = parse_rule(request.json)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            if Rule.query.filter_by(name=fields['name']).first():
+                app.logger.warning(f"Rule {fields['name']} already exists")
+                return jsonify({"error": "Rule already exists"}), 400
+
+            rule = Rule(created_by=current_user.email, **fields)
+            db.session.add(rule)
+            db.session.commit()
+            load_rules()
+
+            app.logger.info(f"Rule {rule.name} created by {current_user.email}")
+            return jsonify({"rule": serialize_rule(rule)}), 201
+
+        except Exception as e:
+            app.logger.error(f"Error creating rule: {e}")
+            return jsonify({"error": "Failed to create rule"}), 500
+
+    @app.route('/update_rule', methods=['POST'])
+    @roles_required('Rule Maker')
+    def update_rule():
+        app.logger.info("Processing /update_rule request")
+        try:
+            data = request.json or {}
+            rule = Rule.query.get(data.get('id'))
+            if not rule:
+                return jsonify({"error": "Rule not found"}), 404
+
+            try:
+                fields = parse_rule({key: value for key, value in data.items() if key != 'id'}, partial=True)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            if 'name' in fields and Rule.query.filter(Rule.name == fields['name'], Rule.id != rule.id).first():
+                return jsonify({"error": "Rule already exists"}), 400
+
+            for key, value in fields.items():
+                setattr(rule, key, value)
+            db.session.commit()
+            load_rules()
+
+            app.logger.info(f"Rule {rule.name} updated by {current_user.email}")
+            return jsonify({"rule": serialize_rule(rule)}), 200
+
+        except Exception as e:
+            app.logger.error(f"Error updating rule: {e}")
+            return jsonify({"error": "Failed to update rule"}), 500
+
+    @app.route('/delete_rule', methods=['POST'])
+    @roles_required('Rule Maker')
+    def delete_rule():
+        app.logger.info("Processing /delete_rule request")
+        try:
+            rule = Rule.query.get((request.json or {}).get('id'))
+            if not rule:
+                return jsonify({"error": "Rule not found"}), 404
+
+            db.session.delete(rule)
+            db.session.commit()
+            load_rules()
+
+            app.logger.info(f"Rule {rule.name} deleted by {current_user.email}")
+            return jsonify({"message": f"Rule {rule.name} deleted"}), 200
+
+        except Exception as e:
+            app.logger.error(f"Error deleting rule: {e}")
+            return jsonify({"error": "Failed to delete rule"}), 500
+
+    @app.route('/evaluate_rules', methods=['POST'])
+    @roles_required('Rule Maker')
+    def evaluate_rules():
+        # Dry run: score the posted transactions against the enabled rules
+        app.logger.info("Processing /evaluate_rules request")
+        try:
+            transactions = (request.json or {}).get('transactions')
+            if not isinstance(transactions, list) or not all(isinstance(t, dict) for t in transactions):
+                return jsonify({"error": "transactions must be a list of objects"}), 400
+
+            compiled, scores, matched = active_rules().score(transactions)
+            return jsonify({
+                "rules": len(compiled.rules),
+                "results": [
+                    {"score": int(score), "rules": rule_ids}
+                    for score, rule_ids in zip(scores, matched)
+                ]
+            }), 200
+
+        except Exception as e:
+            app.logger.error(f"Error evaluating rules: {e}")
+            return jsonify({"error": "Failed to evaluate rules"}), 500
+
+    @app.route('/start_backtest', methods=['POST'])
+    @roles_required('Rule Maker')
+    def start_backtest():
+        app.logger.info("Processing /start_backtest request")
+        try:
+            data = request.json or {}
+            start = data.get('start')
+            end = data.get('end')
+            index = data.get('index') or app.config['ALERT_INDEX_PATTERN']
+            if not start or not end:
+                return jsonify({"error": "start and end are required"}), 400
+            if data.get('index') and not index_catalog.exists(index):
+                return jsonify({"error": f"Index '{index}' does not exist."}), 404
+
+            try:
+                rules = backtest_rules(data)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            job = backtest_runner.submit(rules, index, start, end, send_backtest_progress,
+                                         socketio.start_background_task)
+            app.logger.info(f"Backtest {job.id} of {len(rules)} rules started by {current_user.email}")
+            # Progress is pushed to the job's room; join it with 'watch_backtest'
+            return jsonify({"job_id": job.id, "room": backtest_room(job.id)}), 202
+
+        except Exception as e:
+            app.logger.error(f"Error starting backtest: {e}")
+            return jsonify({"error": "Failed to start backtest"}), 500
+
+    @app.route('/get_backtest', methods=['GET'])
+    @roles_required('Rule Maker')
+    def get_backtest():
+        job = backtest_runner.get(request.args.get('job_id'))
+        if job is None:
+            return jsonify({"error": "Backtest not found"}), 404
+        return jsonify(job.report()), 200
+
+    @app.route('/customer_velocity', methods=['GET'])
+    def customer_velocity():
+        customer_id = request.args.get('customer_id')
+        if not customer_id:
+            return jsonify({"error": "customer_id is required"}), 400
+        return jsonify({
+            "customer_id": customer_id,
+            "windows": velocity_tracker.features(customer_id),
+            "warmed_up": velocity_tracker.warmed_up
+        }), 200
+
+    @app.route('/ingest', methods=['POST'])
+    @auth_required()
+    def ingest():
+        # Body is NDJSON, one raw transaction per line; read as a stream so
+        # memory stays at one batch however large the upload
+        app.logger.info("Processing /ingest request")
+        try:
+            summary = ingest_lines(request.stream)
+            app.logger.info(f"Ingested {summary['ingested']} transactions, {summary['failed']} failed")
+            return jsonify(summary), 200
+
+        except Exception as e:
+            app.logger.error(f"Error ingesting transactions: {e}")
+            return jsonify({"error": "Failed to ingest transactions"}), 500
+
+    @app.cli.command('ingest')
+    @click.argument('source', type=click.File('rb'), default='-')
+    def ingest_command(source):
+        """Score NDJSON transactions from SOURCE (default stdin) and index them as alerts."""
+        # Live delivery is left to the server's change feed: deltas must be
+        # numbered by the feed worker's sequencer, and only its feed knows
+        # what it has already pushed
+        summary = ingest_lines(source, publish=False)
+        click.echo(json.dumps(summary, indent=2, default=str))
+
     @app.route('/create_user', methods=['POST'])
     @roles_required('Admin')
     def create_user():
@@ -326,6 +1258,11 @@ def init_routes(app):
     def get_users():
         app.logger.info("Processing /get_users request")
         try:
+            etag = generations.etag('users', variant='get_users')
+            held = generations.match(request.if_none_match, etag)
+            if held:
+                return not_modified(held, private=True)
+
             users = User.query.all()
             formatted_users = []
             for user in users:
@@ -337,7 +1274,7 @@ def init_routes(app):
                     'confirmed_at': user.confirmed_at
                 })
 
-            return jsonify({"users": formatted_users}), 200
+            return with_etag(jsonify({"users": formatted_users}), etag, private=True), 200
         except Exception as e:
             app.logger.error(f"Error fetching users: {e}")
             return jsonify({"error": "Failed to fetch users"}), 500
@@ -395,8 +1332,54 @@ def init_routes(app):
     @app.route('/get_roles', methods=['GET'])
     def get_roles():
         try:
+            etag = generations.etag('users', variant='get_roles')
+            held = generations.match(request.if_none_match, etag)
+            if held:
+                return not_modified(held)
+
             roles = [role.name for role in Role.query.all()]
-            return jsonify({"roles": roles}), 200
+            return with_etag(jsonify({"roles": roles}), etag), 200
         except Exception as e:
             app.logger.error(f"Error fetching roles: {e}")
             return jsonify({"error": "Failed to fetch roles"}), 500
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return jsonify({
+            "result_cache": result_cache.stats(),
+            "search_coalescing": search_flight.stats(),
+            "change_feed": change_feed.stats(),
+            "deltas": delta_sequencer.stats(),
+            "annotation_write_behind": annotation_buffer.stats(),
+            "doc_locator": doc_locator.stats(),
+            "rules": rule_book.stats(),
+            "percolator_rules": percolator_rules.stats(),
+            "backtests": backtest_runner.stats(),
+            "velocity": velocity_tracker.stats(),
+            "conditional_get": generations.stats(),
+            "poll_guard": poll_guard.stats(),
+            "compression": {
+                "rest": response_compressor.stats(),
+                "websocket": websocket_deflate.stats()
+            }
+        }), 200
+
+    started = []
+
+    def start_background_tasks():
+        # Catalog refresh, change feed, write-behind flushing and velocity
+        # warm-up belong to the web server only, so they start here rather
+        # than on import: `flask ingest` and other CLI commands import the
+        # app too. Every listener is registered by now, so the catalog's
+        # first load reaches all of them.
+        if started:
+            return
+        started.append(True)
+        index_catalog.start(socketio)
+        annotation_buffer.start(socketio)
+        if app.config['CHANGE_FEED_ENABLED']:
+            change_feed.start(socketio)
+        if app.config['VELOCITY_WARM_UP']:
+            socketio.start_background_task(warm_up_velocity)
+
+    return start_background_tasks
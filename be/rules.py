@@ -0,0 +1,307 @@
+import threading
+import time
+import numpy as np
+
+# Transaction fields a rule can test, and how each is held for evaluation
+RULE_FIELDS = {
+    'Total Price': 'number',
+    'Customer ID': 'keyword',
+    'Customer Name': 'keyword',
+    'Customer Gender': 'keyword',
+    'GeoIP City Name': 'keyword',
+    'GeoIP Continent Name': 'keyword',
+    'GeoIP Country ISO Code': 'keyword',
+    'Product Name': 'product'  # Matches any of the transaction's Products
+}
+
+RULE_OPERATORS = {
+    'number': ('gt', 'gte', 'lt', 'lte', 'eq', 'ne', 'between'),
+    'keyword': ('eq', 'ne', 'in', 'not_in'),
+    'product': ('in', 'not_in')
+}
+
+
+def parse_condition(condition):
+    # Validate one {field, op, value} condition and return it normalized
+    if not isinstance(condition, dict):
+        raise ValueError("Condition must be an object")
+
+    field = condition.get('field')
+    op = condition.get('op')
+    value = condition.get('value')
+    kind = RULE_FIELDS.get(field)
+    if kind is None:
+        raise ValueError(f"field must be one of {', '.join(RULE_FIELDS)}")
+    if op not in RULE_OPERATORS[kind]:
+        raise ValueError(f"op for '{field}' must be one of {', '.join(RULE_OPERATORS[kind])}")
+
+    if op == 'between':
+        if not isinstance(value, list) or len(value) != 2:
+            raise ValueError("between takes a [low, high] value")
+        value = [_parse_number(bound) for bound in value]
+        if value[0] > value[1]:
+            raise ValueError("between needs low <= high")
+    elif kind == 'number':
+        value = _parse_number(value)
+    elif op in ('in', 'not_in'):
+        if not isinstance(value, list) or not value:
+            raise ValueError(f"{op} takes a non-empty list value")
+        value = sorted({str(item) for item in value})
+    else:
+        if value is None or isinstance(value, (list, dict)):
+            raise ValueError(f"{op} takes a single value")
+        value = str(value)
+    return {'field': field, 'op': op, 'value': value}
+
+
+def _parse_number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError("Numeric conditions take a number")
+    return float(value)
+
+
+def parse_rule(data, partial=False):
+    # Validate a rule body; with partial=True only the given fields are checked
+    if not isinstance(data, dict):
+        raise ValueError("Rule must be an object")
+
+    fields = {}
+    if 'name' in data or not partial:
+        name = data.get('name')
+        if not isinstance(name, str) or not name.strip():
+            raise ValueError("name is required")
+        fields['name'] = name.strip()
+    if 'description' in data:
+        if data['description'] is not None and not isinstance(data['description'], str):
+            raise ValueError("description must be a string")
+        fields['description'] = data['description']
+    if 'conditions' in data or not partial:
+        conditions = data.get('conditions')
+        if not isinstance(conditions, list) or not conditions:
+            raise ValueError("conditions must be a non-empty list")
+        fields['conditions'] = [parse_condition(condition) for condition in conditions]
+    if 'score' in data or not partial:
+        score = data.get('score', 1)
+        if isinstance(score, bool) or not isinstance(score, int):
+            raise ValueError("score must be an integer")
+        fields['score'] = score
+    if 'enabled' in data:
+        if not isinstance(data['enabled'], bool):
+            raise ValueError("enabled must be a boolean")
+        fields['enabled'] = data['enabled']
+
+    if not fields:
+        raise ValueError("Nothing to update")
+    return fields
+
+
+def _predicate_key(condition):
+    value = condition['value']
+    return condition['field'], condition['op'], tuple(value) if isinstance(value, list) else value
+
+
+class TransactionColumns:
+    # Column-oriented view of one batch. Numbers become float arrays (NaN
+    # when missing); keywords are dictionary-encoded so a predicate is
+    # decided once per distinct value and gathered back with the codes;
+    # products are flattened alongside the row that owns them.
+
+    def __init__(self, transactions, fields):
+        self.size = len(transactions)
+        self.numbers = {}
+        self.keywords = {}
+        self.products = None
+        for field in fields:
+            kind = RULE_FIELDS[field]
+            if kind == 'number':
+                self.numbers[field] = np.fromiter(
+                    (_to_float(transaction.get(field)) for transaction in transactions),
+                    dtype=np.float64, count=self.size
+                )
+            elif kind == 'keyword':
+                vocabulary = {}
+                codes = np.fromiter(
+                    (-1 if transaction.get(field) is None
+                     else vocabulary.setdefault(str(transaction[field]), len(vocabulary))
+                     for transaction in transactions),
+                    dtype=np.intp, count=self.size
+                )
+                self.keywords[field] = (vocabulary, codes)
+            elif self.products is None:
+                vocabulary = {}
+                codes = []
+                rows = []
+                for row, transaction in enumerate(transactions):
+                    for product in transaction.get('Products') or ():
+                        name = product.get('Product Name') if isinstance(product, dict) else None
+                        if name is not None:
+                            codes.append(vocabulary.setdefault(str(name), len(vocabulary)))
+                            rows.append(row)
+                self.products = (vocabulary, np.array(codes, dtype=np.intp), np.array(rows, dtype=np.intp))
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class CompiledRules:
+    # A rule set compiled for batch evaluation. Every distinct condition
+    # across all rules becomes one predicate, evaluated once per batch as a
+    # boolean column; a rule fires where all of its predicate columns are
+    # true, computed for every rule of the same arity in one gather.
+
+    def __init__(self, rules):
+        # rules: [{'id', 'name', 'score', 'conditions'}]
+        self.rules = rules
+        self.rule_ids = np.array([rule['id'] for rule in rules], dtype=object)
+        self.scores = np.array([rule['score'] for rule in rules], dtype=np.int64)
+
+        positions = {}
+        by_arity = {}
+        for rule_position, rule in enumerate(rules):
+            row = sorted({positions.setdefault(_predicate_key(condition), len(positions))
+                          for condition in rule['conditions']})
+            by_arity.setdefault(len(row), ([], []))
+            by_arity[len(row)][0].append(rule_position)
+            by_arity[len(row)][1].append(row)
+
+        self.predicates = list(positions)
+        self.fields = {field for field, _, _ in self.predicates}
+        self._groups = [
+            (np.array(rule_positions, dtype=np.intp), np.array(rows, dtype=np.intp))
+            for rule_positions, rows in by_arity.values()
+        ]
+
+    def evaluate(self, transactions):
+        # Returns (hits, scores): hits[r, t] is True when rule r fires on
+        # transaction t; scores[t] sums the scores of the rules that fired
+        columns = TransactionColumns(transactions, self.fields)
+        masks = np.empty((len(self.predicates), columns.size), dtype=bool)
+        for position, predicate in enumerate(self.predicates):
+            masks[position] = self._evaluate_predicate(columns, *predicate)
+
+        hits = np.zeros((len(self.rules), columns.size), dtype=bool)
+        for rule_positions, rows in self._groups:
+            hits[rule_positions] = masks[rows].all(axis=1)
+        scores = self.scores @ hits if len(self.rules) else np.zeros(columns.size, dtype=np.int64)
+        return hits, scores
+
+    def matched_rules(self, hits):
+        # The ids of the rules that fired on each transaction, in rule order
+        if not hits.shape[1]:
+            return []
+        transaction_positions, rule_positions = np.nonzero(hits.T)
+        bounds = np.searchsorted(transaction_positions, np.arange(1, hits.shape[1]))
+        return [ids.tolist() for ids in np.split(self.rule_ids[rule_positions], bounds)]
+
+    def _evaluate_predicate(self, columns, field, op, value):
+        kind = RULE_FIELDS[field]
+        if kind == 'number':
+            column = columns.numbers[field]
+            if op == 'gt':
+                return column > value
+            if op == 'gte':
+                return column >= value
+            if op == 'lt':
+                return column < value
+            if op == 'lte':
+                return column <= value
+            if op == 'eq':
+                return column == value
+            if op == 'ne':
+                return (column != value) & ~np.isnan(column)
+            return (column >= value[0]) & (column <= value[1])
+
+        values = (value,) if op in ('eq', 'ne') else value
+        negate = op in ('ne', 'not_in')
+        if kind == 'keyword':
+            vocabulary, codes = columns.keywords[field]
+            # One slot per distinct value plus a trailing one that missing values (-1) land on
+            lookup = np.zeros(len(vocabulary) + 1, dtype=bool)
+            if negate:
+                lookup[:-1] = True
+            for item in values:
+                code = vocabulary.get(item)
+                if code is not None:
+                    lookup[code] = not negate
+            return lookup[codes]
+
+        vocabulary, codes, rows = columns.products
+        lookup = np.zeros(len(vocabulary), dtype=bool)
+        for item in values:
+            code = vocabulary.get(item)
+            if code is not None:
+                lookup[code] = True
+        matched = np.zeros(columns.size, dtype=bool)
+        matched[rows[lookup[codes]]] = True
+        return ~matched if negate else matched
+
+
+class RuleBook:
+    # Holds the compiled form of the enabled rules. A reload compiles a new
+    # rule set and swaps it in whole, so scoring never sees a half-built one.
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._compiled = CompiledRules([])
+        self._loaded_at = None
+        self.compiles = 0
+        self.last_compile_seconds = 0.0
+        self.batches = 0
+        self.scored = 0
+        self.total_score_seconds = 0.0
+
+    def load(self, rules):
+        started = time.monotonic()
+        compiled = CompiledRules(rules)
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._compiled = compiled
+            self._loaded_at = time.monotonic()
+            self.compiles += 1
+            self.last_compile_seconds = elapsed
+        return compiled
+
+    def age(self):
+        # Seconds since the last load; None before the first one
+        with self._lock:
+            return None if self._loaded_at is None else time.monotonic() - self._loaded_at
+
+    def current(self):
+        with self._lock:
+            return self._compiled
+
+    def score(self, transactions):
+        # Score transactions in batch_size slices against one rule set.
+        # Returns (compiled, scores, matched rule ids per transaction).
+        compiled = self.current()
+        scores = np.zeros(len(transactions), dtype=np.int64)
+        matched = []
+        for start in range(0, len(transactions), self.batch_size):
+            batch = transactions[start:start + self.batch_size]
+            started = time.monotonic()
+            hits, batch_scores = compiled.evaluate(batch)
+            scores[start:start + len(batch)] = batch_scores
+            matched.extend(compiled.matched_rules(hits))
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self.batches += 1
+                self.scored += len(batch)
+                self.total_score_seconds += elapsed
+        return compiled, scores, matched
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rules": len(self._compiled.rules),
+                "predicates": len(self._compiled.predicates),
+                "compiles": self.compiles,
+                "last_compile_ms": round(self.last_compile_seconds * 1000, 2),
+                "batches": self.batches,
+                "scored_transactions": self.scored,
+                "transactions_per_second": round(self.scored / self.total_score_seconds) if self.total_score_seconds else 0
+            }
@@ -0,0 +1,72 @@
+import threading
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self, event):
+        self.event = event
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    # Collapses concurrent calls for the same key into one execution whose
+    # result (or exception) is handed to every caller. Events come from the
+    # Socket.IO server so waiting works under threading, eventlet and gevent.
+
+    def __init__(self, event_factory, timeout):
+        self.event_factory = event_factory
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executions = 0
+        self.collapsed = 0
+        self.timeouts = 0
+        self.max_waiters = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call(self.event_factory())
+                self._calls[key] = call
+                self.executions += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self.collapsed += 1
+                self.max_waiters = max(self.max_waiters, call.waiters)
+                leader = False
+
+        if not leader:
+            if not call.event.wait(self.timeout):
+                # The in-flight call is stuck; don't let it hold this caller hostage
+                with self._lock:
+                    self.timeouts += 1
+                return fn()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "executions": self.executions,
+                "collapsed": self.collapsed,
+                "timeouts": self.timeouts,
+                "max_waiters": self.max_waiters
+            }
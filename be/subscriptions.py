@@ -0,0 +1,68 @@
+from collections import OrderedDict
+from transactions import UNREVIEWED_LABEL
+
+# Socket.IO room naming for live updates. A client watching an index joins
+# the room for its index/filter combination (new alerts) plus the index's
+# updates room for its label filter (annotation changes to rows it may be
+# displaying).
+
+
+def subscription_room(index, customer_id=None, order_id=None):
+    room = f"index:{index}"
+    if customer_id:
+        room += f"|customer:{customer_id}"
+    if order_id:
+        room += f"|order:{order_id}"
+    return room
+
+
+def updates_room(index, label=None):
+    room = f"updates:{index}"
+    if label:
+        room += f"|label:{label}"
+    return room
+
+
+def rooms_for_document(index, source):
+    # Every subscription room whose filters this document satisfies
+    customer_id = source.get('Customer ID')
+    order_id = source.get('Order ID')
+    rooms = [subscription_room(index)]
+    if customer_id:
+        rooms.append(subscription_room(index, customer_id=customer_id))
+    if order_id:
+        rooms.append(subscription_room(index, order_id=order_id))
+    if customer_id and order_id:
+        rooms.append(subscription_room(index, customer_id=customer_id, order_id=order_id))
+    return rooms
+
+
+def group_by_room(index, transactions):
+    # room -> the formatted transactions that room should receive, in order
+    grouped = OrderedDict()
+    for transaction in transactions:
+        for room in rooms_for_document(index, transaction.get('data', {})):
+            grouped.setdefault(room, []).append(transaction)
+    return grouped
+
+
+def group_changes(index, changes, label_filters):
+    # (room, delta) for every updates room of the index. Views filtered on
+    # a label get the ids of rows a change relabelled away from it as
+    # 'evicted' instead of the change itself.
+    room_deltas = [(updates_room(index), {'changed': changes})]
+    for label_filter in label_filters:
+        changed, evicted = [], []
+        for change in changes:
+            fields = change['fields']
+            if 'label' in fields and (fields['label'] or UNREVIEWED_LABEL) != label_filter:
+                evicted.append(change['id'])
+            else:
+                changed.append(change)
+        room_deltas.append((updates_room(index, label_filter), {'changed': changed, 'evicted': evicted}))
+    return room_deltas
+
+
+def backtest_room(job_id):
+    # Progress reports for one backtest job
+    return f"backtest:{job_id}"
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The backend modules live next to this directory and import each other by name
+BE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BE_DIR)
@@ -0,0 +1,77 @@
+import pytest
+from flask import Flask
+from flask_socketio import SocketIO, join_room
+from socketio import PubSubManager
+from conftest import BE_DIR
+
+CHANNEL = 'fraud-test'
+ROOM = 'index:high-alert'
+
+
+class MemoryQueue(PubSubManager):
+    # In-process stand-in for the broker: messages published on a channel
+    # are handed straight to that channel's subscribers. Workers subscribe
+    # with a function applying the message the way their queue listener
+    # would, so the emitter side runs unchanged.
+    channels = {}
+
+    def __init__(self, channel):
+        super().__init__(channel=channel, write_only=True)
+
+    @classmethod
+    def subscribe(cls, channel, handler):
+        cls.channels.setdefault(channel, []).append(handler)
+
+    def _publish(self, data):
+        for handler in self.channels.get(self.channel, []):
+            handler(data)
+
+
+def relay_to(worker):
+    # What a worker's queue listener does with an emit published by another process
+    def handle(message):
+        assert message['method'] == 'emit'
+        worker.emit(message['event'], message['data'], to=message['room'],
+                    namespace=message['namespace'], skip_sid=message['skip_sid'])
+    return handle
+
+
+@pytest.fixture
+def worker():
+    # A worker with two connected clients, one of them in the index room
+    app = Flask(__name__)
+    socketio = SocketIO(app)
+
+    @socketio.on('subscribe')
+    def on_subscribe(data):
+        join_room(data['room'])
+
+    MemoryQueue.subscribe(CHANNEL, relay_to(socketio))
+    yield app, socketio
+    MemoryQueue.channels.clear()
+
+
+def test_emitter_reaches_clients_of_a_worker(monkeypatch, worker):
+    monkeypatch.chdir(BE_DIR)  # config.py loads http_ca.crt relative to the backend
+    from emitter import create_emitter
+
+    app, socketio = worker
+    subscriber = socketio.test_client(app)
+    bystander = socketio.test_client(app)
+    subscriber.emit('subscribe', {'room': ROOM})
+
+    emitter = create_emitter('memory://', client_manager=MemoryQueue(CHANNEL))
+    payload = {'index': 'high-alert', 'epoch': 'a1b2c3d4', 'seq': 1, 'base_seq': 0,
+               'inserted': [], 'changed': [], 'evicted': []}
+    emitter.emit('transactions_delta', payload, to=ROOM)
+
+    assert subscriber.get_received() == [{'name': 'transactions_delta', 'args': [payload], 'namespace': '/'}]
+    assert bystander.get_received() == []
+
+
+def test_emitter_requires_a_queue(monkeypatch):
+    monkeypatch.chdir(BE_DIR)
+    import emitter
+    monkeypatch.setattr(emitter.DevelopmentConfig, 'SOCKETIO_MESSAGE_QUEUE', None)
+    with pytest.raises(ValueError):
+        emitter.create_emitter()
@@ -0,0 +1,240 @@
+import base64
+import csv
+import io
+import json
+from fastjson import dumps
+
+# Sort used for every search_after/PIT search: newest first, with the PIT
+# shard/doc tiebreaker so hits sharing a timestamp keep a stable order
+CURSOR_SORT = [{"@timestamp": "desc"}, {"_shard_doc": "desc"}]
+REVERSE_CURSOR_SORT = [{"@timestamp": "asc"}, {"_shard_doc": "asc"}]
+
+# `label` filter value selecting alerts no analyst has labelled yet
+UNREVIEWED_LABEL = 'unreviewed'
+
+# _source fields behind the collapsed rows of the transactions table, for
+# view=summary; the rest of the document is fetched when a row is expanded
+SUMMARY_FIELDS = [
+    '@timestamp', 'Order Time', 'Customer Name', 'Customer ID', 'Customer Gender', 'GeoIP City Name',
+    'GeoIP Continent Name', 'GeoIP Country ISO Code', 'Order ID', 'Products.Product Name', 'Total Price'
+]
+
+# Annotation fields format_transaction reads, included in every projection
+ANNOTATION_FIELDS = ['tickbox', 'remark', 'label']
+
+# Columns written by the CSV export, matching the transactions table
+EXPORT_CSV_FIELDS = [
+    '@timestamp', 'Order Time', 'Order ID', 'Customer ID', 'Customer Name', 'Customer Gender',
+    'GeoIP City Name', 'GeoIP Continent Name', 'GeoIP Country ISO Code', 'Total Price'
+]
+
+
+def build_transactions_query(current_date, order_id=None, customer_id=None, label=None):
+    # Construct the base query to fetch transactions
+    query = {
+        "bool": {
+            "must": [
+                {
+                    "range": {
+                        "@timestamp": {
+                            "lte": current_date
+                        }
+                    }
+                }
+            ]
+        }
+    }
+
+    # Add filtering by order_id if provided
+    if order_id:
+        query["bool"]["must"].append({
+            "term": {"Order ID.keyword": order_id}  # Adjust to match Elasticsearch field
+        })
+
+    # Add filtering by customer_id if provided
+    if customer_id:
+        query["bool"]["must"].append({
+            "term": {"Customer ID.keyword": customer_id}  # Adjust to match Elasticsearch field
+        })
+
+    # Filter on the analyst label mirrored into the keyword `label` field
+    if label == UNREVIEWED_LABEL:
+        query["bool"]["must_not"] = [{"exists": {"field": "label"}}]
+    elif label:
+        query["bool"]["filter"] = [{"term": {"label": label}}]
+
+    return query
+
+
+def source_includes(view=None, fields=None):
+    # The `_source` setting for a request: True for whole documents, or the
+    # fields to include. Explicit fields win over a named view.
+    if fields:
+        names = [name.strip() for name in fields.split(',') if name.strip()]
+        if not names:
+            raise ValueError("fields must name at least one field")
+        return sorted(set(names + ANNOTATION_FIELDS))
+    if view == 'summary':
+        return SUMMARY_FIELDS + ANNOTATION_FIELDS
+    if view in (None, 'full'):
+        return True
+    raise ValueError(f"Unknown view '{view}'")
+
+
+def format_transaction(transaction):
+    source = transaction.get('_source', {})
+    utc_timestamp = source.get('@timestamp')
+
+    return {
+        'id': transaction.get('_id', 'N/A'),
+        'index': transaction.get('_index'),
+        'timestamp': utc_timestamp if utc_timestamp else 'N/A',
+        'data': source,  # Include all data here
+        'tickbox': source.get('tickbox', False),
+        'remark': source.get('remark', ''),
+        'label': source.get('label')
+    }
+
+
+def encode_cursor(pit_id, search_after, as_of, page, direction='next'):
+    payload = {
+        'pit': pit_id,
+        'after': search_after,
+        'as_of': as_of,
+        'page': page,
+        'dir': direction
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(token):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Malformed cursor: {e}")
+
+    if not isinstance(payload, dict) or not payload.get('pit') or payload.get('dir') not in ('next', 'prev'):
+        raise ValueError("Malformed cursor")
+    # Cursors come back from clients, so a crafted or truncated one must
+    # fail here rather than deep inside the search
+    if not isinstance(payload['pit'], str) or not isinstance(payload.get('as_of'), str):
+        raise ValueError("Malformed cursor: bad pit or as_of")
+    page = payload.get('page')
+    if not isinstance(page, int) or isinstance(page, bool) or page < 1:
+        raise ValueError("Malformed cursor: bad page")
+    if not isinstance(payload.get('after'), list) or not payload['after']:
+        raise ValueError("Malformed cursor: bad after")
+    return payload
+
+
+def search_with_pit(es, query, size, pit_id, keep_alive, search_after=None, reverse=False, source=True,
+                    track_total_hits=True):
+    body = {
+        "query": query,
+        "size": size,
+        "sort": REVERSE_CURSOR_SORT if reverse else CURSOR_SORT,
+        "pit": {"id": pit_id, "keep_alive": keep_alive}
+    }
+    if search_after:
+        body["search_after"] = search_after
+    if source is not True:
+        body["_source"] = source  # False, or the list of fields to return
+    if not track_total_hits:
+        body["track_total_hits"] = False
+
+    res = es.search(body=body)
+    hits = res.get('hits', {}).get('hits', [])
+    if reverse:
+        # Walking backwards returns the previous page oldest-first
+        hits = list(reversed(hits))
+    return res, hits
+
+
+def close_pit(es, pit_id):
+    try:
+        es.close_point_in_time(body={"id": pit_id})
+    except Exception:
+        # The PIT expires on its own after keep_alive
+        pass
+
+
+def seek_page(es, index, query, page, size, keep_alive, batch_size, source=True):
+    # Walk to the requested page with search_after instead of from/size.
+    # Skipped hits are fetched without _source, so only sort values cross
+    # the wire and no shard ever has to sort more than batch_size hits.
+    # The PIT stays open for the cursors of the page; callers close it
+    # when there are none.
+    pit_id = es.open_point_in_time(index=index, keep_alive=keep_alive)['id']
+    remaining = (page - 1) * size
+    search_after = None
+
+    try:
+        while remaining > 0:
+            res, hits = search_with_pit(es, query, min(batch_size, remaining), pit_id, keep_alive,
+                                        search_after=search_after, source=False, track_total_hits=False)
+            pit_id = res.get('pit_id', pit_id)
+            if not hits:
+                break
+            remaining -= len(hits)
+            search_after = hits[-1]['sort']
+
+        res, hits = search_with_pit(es, query, size, pit_id, keep_alive, search_after=search_after, source=source)
+    except Exception:
+        close_pit(es, pit_id)
+        raise
+    return res, hits, res.get('pit_id', pit_id)
+
+
+def page_cursors(hits, size, pit_id, as_of, page):
+    next_cursor = None
+    prev_cursor = None
+    if hits and len(hits) >= size:
+        next_cursor = encode_cursor(pit_id, hits[-1]['sort'], as_of, page + 1, 'next')
+    if hits and page > 1:
+        prev_cursor = encode_cursor(pit_id, hits[0]['sort'], as_of, page - 1, 'prev')
+    return next_cursor, prev_cursor
+
+
+def iter_transactions(es, index, query, batch_size, keep_alive, source=True):
+    # Stream every matching hit through a point-in-time, one batch in memory at a time
+    pit_id = es.open_point_in_time(index=index, keep_alive=keep_alive)['id']
+    search_after = None
+    try:
+        while True:
+            res, hits = search_with_pit(es, query, batch_size, pit_id, keep_alive,
+                                        search_after=search_after, source=source, track_total_hits=False)
+            pit_id = res.get('pit_id', pit_id)
+            if not hits:
+                break
+            yield hits
+            if len(hits) < batch_size:
+                break
+            search_after = hits[-1]['sort']
+    finally:
+        close_pit(es, pit_id)
+
+
+def export_csv_header():
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(['id', 'index'] + EXPORT_CSV_FIELDS + ['Products', 'tickbox', 'remark', 'label'])
+    return buffer.getvalue()
+
+
+def export_csv_rows(transactions):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for transaction in transactions:
+        source = transaction['data']
+        products = source.get('Products') or []
+        writer.writerow(
+            [transaction['id'], transaction['index']]
+            + [source.get(field, '') for field in EXPORT_CSV_FIELDS]
+            + ['; '.join(p.get('Product Name', '') for p in products),
+               transaction['tickbox'], transaction['remark'], transaction['label'] or '']
+        )
+    return buffer.getvalue()
+
+
+def export_ndjson_rows(transactions):
+    return ''.join(dumps(transaction) + '\n' for transaction in transactions)
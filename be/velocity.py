@@ -0,0 +1,207 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime, timezone
+from transactions import iter_transactions
+
+# Upper bound on remembered alert ids, which keep an alert delivered twice
+# (by /ingest and again by the change feed) from being counted twice
+MAX_RECORDED_IDS = 200000
+
+# The only alert fields the velocity features read
+VELOCITY_SOURCE_FIELDS = ['@timestamp', 'Customer ID', 'Total Price', 'GeoIP Country ISO Code']
+
+
+def parse_timestamp(value):
+    # Epoch seconds for an ISO-8601 @timestamp; naive values are UTC
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _price(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class _CustomerBuckets:
+    # Non-empty time buckets of one customer, oldest first, held in
+    # parallel arrays. countries holds one bitmask per bucket over the
+    # tracker's interned country codes, so distinct countries across any
+    # span of buckets is the popcount of their OR.
+    __slots__ = ('starts', 'counts', 'totals', 'countries')
+
+    def __init__(self):
+        self.starts = array('q')
+        self.counts = array('I')
+        self.totals = array('d')
+        self.countries = []
+
+
+class VelocityTracker:
+    # Sliding-window order velocity per Customer ID, maintained
+    # incrementally from the alerts the app already sees. Orders are
+    # counted into bucket_seconds buckets by their @timestamp; buckets older
+    # than the longest window are dropped as customers are touched, and
+    # the least recently active customers are evicted beyond max_customers.
+
+    def __init__(self, windows, bucket_seconds, max_customers):
+        self.windows = windows  # name -> seconds, e.g. {'1h': 3600}
+        self.horizon = max(windows.values())
+        self.bucket_seconds = bucket_seconds
+        self.max_customers = max_customers
+        self._lock = threading.Lock()
+        self._customers = OrderedDict()  # customer id -> _CustomerBuckets
+        self._country_bits = {}  # country code -> bit position
+        self._recorded_ids = OrderedDict()  # (index, id) -> None
+        self.recorded = 0
+        self.too_old = 0
+        self.evictions = 0
+        self.duplicates = 0
+        self.warmed_up = False
+
+    def record(self, customer_id, timestamp, total_price, country, now=None):
+        if customer_id is None:
+            return False
+        now = time.time() if now is None else now
+        if timestamp is None:
+            timestamp = now
+        if timestamp < now - self.horizon:
+            with self._lock:
+                self.too_old += 1
+            return False
+
+        start = int(timestamp // self.bucket_seconds) * self.bucket_seconds
+        with self._lock:
+            bit = 0
+            if country:
+                bit = 1 << self._country_bits.setdefault(country, len(self._country_bits))
+
+            key = str(customer_id)
+            buckets = self._customers.get(key)
+            if buckets is None:
+                buckets = self._customers[key] = _CustomerBuckets()
+            else:
+                self._customers.move_to_end(key)
+            self._expire(buckets, now)
+
+            # Alerts mostly arrive in time order, so this is nearly always an append
+            position = bisect_left(buckets.starts, start)
+            if position < len(buckets.starts) and buckets.starts[position] == start:
+                buckets.counts[position] += 1
+                buckets.totals[position] += total_price
+                buckets.countries[position] |= bit
+            else:
+                buckets.starts.insert(position, start)
+                buckets.counts.insert(position, 1)
+                buckets.totals.insert(position, total_price)
+                buckets.countries.insert(position, bit)
+            self.recorded += 1
+
+            while len(self._customers) > self.max_customers:
+                self._customers.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def _first_sighting(self, hit):
+        if '_id' not in hit:
+            return True
+        key = (hit.get('_index'), hit['_id'])
+        with self._lock:
+            if key in self._recorded_ids:
+                self.duplicates += 1
+                return False
+            self._recorded_ids[key] = None
+            while len(self._recorded_ids) > MAX_RECORDED_IDS:
+                self._recorded_ids.popitem(last=False)
+        return True
+
+    def record_hits(self, hits, now=None):
+        for hit in hits:
+            if not self._first_sighting(hit):
+                continue
+            source = hit.get('_source', {})
+            self.record(
+                source.get('Customer ID'),
+                parse_timestamp(source.get('@timestamp')),
+                _price(source.get('Total Price')),
+                source.get('GeoIP Country ISO Code'),
+                now=now
+            )
+
+    def _expire(self, buckets, now):
+        # Drop buckets that ended before the longest window began
+        stale = bisect_right(buckets.starts, now - self.horizon - self.bucket_seconds)
+        if stale:
+            del buckets.starts[:stale]
+            del buckets.counts[:stale]
+            del buckets.totals[:stale]
+            del buckets.countries[:stale]
+
+    def features(self, customer_id, now=None):
+        # {window: {'orders', 'total_price', 'countries'}} as of now. A
+        # bucket counts toward a window if any part of it falls inside, so
+        # windows are accurate to bucket_seconds.
+        now = time.time() if now is None else now
+        result = {}
+        with self._lock:
+            buckets = self._customers.get(str(customer_id)) if customer_id is not None else None
+            for name, seconds in self.windows.items():
+                if buckets is None:
+                    result[name] = {'orders': 0, 'total_price': 0.0, 'countries': 0}
+                    continue
+                first = bisect_right(buckets.starts, now - seconds - self.bucket_seconds)
+                mask = 0
+                for bits in buckets.countries[first:]:
+                    mask |= bits
+                result[name] = {
+                    'orders': sum(buckets.counts[first:]),
+                    'total_price': round(sum(buckets.totals[first:]), 2),
+                    'countries': bin(mask).count('1')
+                }
+        return result
+
+    def attach(self, transactions, now=None):
+        # Add a 'velocity' entry to formatted transactions, once per customer per call
+        now = time.time() if now is None else now
+        by_customer = {}
+        for transaction in transactions:
+            customer_id = transaction.get('data', {}).get('Customer ID')
+            if customer_id is None:
+                transaction['velocity'] = None
+                continue
+            if customer_id not in by_customer:
+                by_customer[customer_id] = self.features(customer_id, now=now)
+            transaction['velocity'] = by_customer[customer_id]
+        return transactions
+
+    def warm_up(self, es, index, batch_size, keep_alive):
+        # Load the last horizon of alerts so features are complete right
+        # after a restart; the change feed and /ingest take over from there.
+        query = {"range": {"@timestamp": {"gte": f"now-{self.horizon}s", "lte": "now"}}}
+        for hits in iter_transactions(es, index, query, batch_size, keep_alive, source=VELOCITY_SOURCE_FIELDS):
+            self.record_hits(hits)
+        self.warmed_up = True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "customers": len(self._customers),
+                "max_customers": self.max_customers,
+                "buckets": sum(len(buckets.starts) for buckets in self._customers.values()),
+                "recorded": self.recorded,
+                "too_old": self.too_old,
+                "evictions": self.evictions,
+                "duplicates": self.duplicates,
+                "warmed_up": self.warmed_up
+            }
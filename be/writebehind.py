@@ -0,0 +1,164 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Pending:
+    __slots__ = ('fields', 'waiters')
+
+    def __init__(self):
+        self.fields = {}
+        self.waiters = []
+
+
+class _Waiter:
+    __slots__ = ('event', 'ok', 'error')
+
+    def __init__(self, event):
+        self.event = event
+        self.ok = False
+        self.error = None
+
+    def wait(self, timeout):
+        # True once the write reached Elasticsearch, False on failure or timeout
+        if not self.event.wait(timeout):
+            self.error = "Timed out waiting for flush"
+            return False
+        return self.ok
+
+
+class WriteBehindBuffer:
+    # Collects annotation writes in memory and flushes them in batches,
+    # every flush_interval seconds or as soon as max_operations are queued.
+    # Writes to the same document are merged field by field (last writer
+    # wins), so a burst of edits to one row becomes a single update.
+
+    def __init__(self, flush_fn, event_factory, flush_interval, max_operations, logger):
+        self.flush_fn = flush_fn  # [(index, id, fields)] -> [(ok, error)]
+        self.flush_interval = flush_interval
+        self.max_operations = max_operations
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._event_factory = event_factory
+        self._wake = event_factory()
+        self._pending = OrderedDict()  # (index, id) -> _Pending
+        self._queued_operations = 0
+        self._listeners = []
+        self._started = False
+        self.enqueued = 0
+        self.merged = 0
+        self.flushes = 0
+        self.flushed_documents = 0
+        self.failed_documents = 0
+        self.max_batch = 0
+        self.total_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.last_flush_seconds = 0.0
+
+    def on_flushed(self, listener):
+        # listener(updates, outcomes) runs after every flush
+        self._listeners.append(listener)
+
+    def enqueue(self, index, doc_id, fields, wait=False):
+        # Returns a waiter when wait=True (ack-on-flush), otherwise None
+        with self._lock:
+            key = (index, doc_id)
+            entry = self._pending.get(key)
+            if entry is None:
+                entry = self._pending[key] = _Pending()
+            else:
+                self.merged += 1
+            entry.fields.update(fields)
+            self.enqueued += 1
+            self._queued_operations += 1
+
+            waiter = None
+            if wait:
+                waiter = _Waiter(self._event_factory())
+                entry.waiters.append(waiter)
+            full = self._queued_operations >= self.max_operations
+
+        if full:
+            self._wake.set()
+        return waiter
+
+    def flush(self):
+        # Only one flush at a time, so batches reach Elasticsearch in order
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending
+                self._pending = OrderedDict()
+                self._queued_operations = 0
+            if not batch:
+                return 0
+
+            updates = [(index, doc_id, entry.fields) for (index, doc_id), entry in batch.items()]
+            started = time.monotonic()
+            try:
+                outcomes = self.flush_fn(updates)
+            except Exception as e:
+                self.logger.error(f"Write-behind flush of {len(updates)} documents failed: {e}")
+                outcomes = [(False, str(e))] * len(updates)
+            elapsed = time.monotonic() - started
+
+            failed = sum(1 for ok, error in outcomes if not ok)
+            if failed:
+                self.logger.error(f"Write-behind flush failed for {failed} of {len(updates)} documents")
+
+            with self._lock:
+                self.flushes += 1
+                self.flushed_documents += len(updates)
+                self.failed_documents += failed
+                self.max_batch = max(self.max_batch, len(updates))
+                self.total_flush_seconds += elapsed
+                self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+                self.last_flush_seconds = elapsed
+
+            # Listeners invalidate caches and bump ETags, so they run before
+            # the writers are released: a client refetching right after its
+            # ack must not get the page from before its write
+            for listener in self._listeners:
+                try:
+                    listener(updates, outcomes)
+                except Exception as e:
+                    self.logger.error(f"Write-behind flush listener failed: {e}")
+
+            for entry, (ok, error) in zip(batch.values(), outcomes):
+                for waiter in entry.waiters:
+                    waiter.ok = ok
+                    waiter.error = error
+                    waiter.event.set()
+            return len(updates)
+
+    def run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self.logger.error(f"Error in write-behind flusher: {e}")
+
+    def start(self, socketio):
+        if self._started:
+            return
+        self._started = True
+        socketio.start_background_task(self.run)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending_documents": len(self._pending),
+                "enqueued_operations": self.enqueued,
+                "merged_operations": self.merged,
+                "merge_ratio": round(self.enqueued / self.flushed_documents, 4) if self.flushed_documents else 0.0,
+                "flushes": self.flushes,
+                "flushed_documents": self.flushed_documents,
+                "failed_documents": self.failed_documents,
+                "avg_batch_size": round(self.flushed_documents / self.flushes, 2) if self.flushes else 0.0,
+                "max_batch_size": self.max_batch,
+                "last_flush_ms": round(self.last_flush_seconds * 1000, 2),
+                "avg_flush_ms": round(self.total_flush_seconds * 1000 / self.flushes, 2) if self.flushes else 0.0,
+                "max_flush_ms": round(self.max_flush_seconds * 1000, 2)
+            }
@@ -1,5 +1,5 @@
 // Transactions.js
-import React, { useEffect, useState, useCallback } from 'react';
+import React, { useEffect, useState, useCallback, useRef } from 'react';
 import PropTypes from 'prop-types';
 import io from 'socket.io-client';
 import axios from 'axios';
@@ -12,13 +12,19 @@ const Transactions = ({ userId, userEmail, loginTimestamp, onLogout }) => {
     const [pageSize, setPageSize] = useState(10);
     const [currentPage, setCurrentPage] = useState(1);
     const [inputPage, setInputPage] = useState(1);
+    const [cursor, setCursor] = useState(null); // Set when the page was reached by following a cursor
     const [orderId, setOrderId] = useState('');
     const [customerId, setCustomerId] = useState('');
+    const [labelFilter, setLabelFilter] = useState('');
     const [newDataAvailable, setNewDataAvailable] = useState(false);
     const [expandedRows, setExpandedRows] = useState([]);
     const [selectedIndex, setSelectedIndex] = useState('');
     const [indices, setIndices] = useState([]);
     const [totalTransactions, setTotalTransactions] = useState(0); // To track total number of transactions
+    const syncRef = useRef({ epoch: null, seq: 0 }); // Live delta position of the page on screen
+    const detailsRef = useRef(new Set()); // Rows whose full document has been loaded
+    const cursorsRef = useRef({ next: null, prev: null }); // Cursors to the pages either side, deep pages only
+    const rowsRef = useRef([]); // The rows on screen, for deltas to check against
 
     const fetchIndices = useCallback(() => {
         axios.get('http://localhost:5000/get_indices')
@@ -44,6 +50,9 @@ const Transactions = ({ userId, userEmail, loginTimestamp, onLogout }) => {
                 size: pageSize,
                 order_id: orderId || null,
                 customer_id: customerId || null,
+                label: labelFilter || null,
+                view: 'summary', // Full documents are fetched when a row is expanded
+                cursor: cursor || null, // The server continues inside the cursor's point-in-time
             }
         })
         .then(response => {
@@ -52,18 +61,43 @@ const Transactions = ({ userId, userEmail, loginTimestamp, onLogout }) => {
             console.log('Raw transactions data:', newTransactions);
 
             setTransactions(newTransactions);
+            detailsRef.current = new Set();
             setTotalTransactions(total); // Update total transactions count
+            syncRef.current = { epoch: response.data.epoch, seq: response.data.seq || 0 };
+            cursorsRef.current = { next: response.data.next_cursor, prev: response.data.prev_cursor };
+            setNewDataAvailable(false);
         })
         .catch(error => {
+            if (cursor && error.response && error.response.status === 410) {
+                setCursor(null); // The point-in-time expired; reload the page by number
+                return;
+            }
             console.error("Error fetching transactions:", error);
             alert('Error fetching transactions: ' + error.message);
         });
-    }, [selectedIndex, currentPage, pageSize, orderId, customerId]);
+    }, [selectedIndex, currentPage, pageSize, orderId, customerId, labelFilter, cursor]);
+
+    // A cursor shows its page as of when it was opened, so reloads for new data go by page number
+    const refreshTransactions = useCallback(() => {
+        if (cursor) {
+            setCursor(null);
+        } else {
+            fetchTransactions();
+        }
+    }, [cursor, fetchTransactions]);
+
+    // Changing what is listed invalidates the cursors of the current listing
+    const changeFilter = (setter) => (event) => {
+        setCursor(null);
+        cursorsRef.current = { next: null, prev: null };
+        setter(event.target.value);
+    };
 
     const handlePageChange = (event) => {
         const newPage = parseInt(event.target.value, 10);
         const maxPage = Math.ceil(totalTransactions / pageSize); // Calculate max page
         if (!isNaN(newPage) && newPage >= 1 && newPage <= maxPage) {
+            setCursor(null); // Jumps seek by page number
             setCurrentPage(newPage);
             setInputPage(newPage);
         }
@@ -76,6 +110,8 @@ const Transactions = ({ userId, userEmail, loginTimestamp, onLogout }) => {
     const handleNextPage = () => {
         const maxPage = Math.ceil(totalTransactions / pageSize); // Calculate max page
         if (currentPage < maxPage) {
+            // Deep pages continue from the cursor in constant time instead of seeking again
+            setCursor(cursorsRef.current.next);
             setCurrentPage(prev => prev + 1);
             setInputPage(prev => prev + 1);
         }
@@ -83,12 +119,50 @@ const Transactions = ({ userId, userEmail, loginTimestamp, onLogout }) => {
 
     const handlePreviousPage = () => {
         if (currentPage > 1) {
+            // The first page is cheap and should show the latest alerts, so it never uses a cursor
+            setCursor(currentPage > 2 ? cursorsRef.current.prev : null);
             setCurrentPage(prev => Math.max(prev - 1, 1));
             setInputPage(prev => Math.max(prev - 1, 1));
         }
     };
 
+    const handleLabelChange = (tx, label) => {
+        axios.post('http://localhost:5000/set_label', {
+            id: tx.id,
+            index: tx.index,
+            label: label || null,
+        }, { withCredentials: true })
+        .then(() => {
+            setTransactions((prevTransactions) =>
+                prevTransactions.map((row) => (row.id === tx.id ? { ...row, label: label || null } : row))
+            );
+        })
+        .catch(error => {
+            console.error("Error setting label:", error);
+            alert('Error setting label: ' + error.message);
+        });
+    };
+
+    const loadTransactionDetails = (id) => {
+        const tx = transactions.find((row) => row.id === id);
+        if (!tx || detailsRef.current.has(id)) return;
+        axios.get(`http://localhost:5000/get_transaction/${encodeURIComponent(tx.index)}/${encodeURIComponent(id)}`)
+        .then(response => {
+            const detail = response.data.transaction;
+            detailsRef.current.add(id);
+            setTransactions((prevTransactions) =>
+                prevTransactions.map((row) => (row.id === id ? { ...row, data: detail.data } : row))
+            );
+        })
+        .catch(error => {
+            console.error("Error fetching transaction details:", error);
+        });
+    };
+
     const toggleRowExpansion = (id) => {
+        if (!expandedRows.includes(id)) {
+            loadTransactionDetails(id);
+        }
         setExpandedRows((prevExpandedRows) => 
             prevExpandedRows.includes(id) 
                 ? prevExpandedRows.filter(rowId => rowId !== id) 
@@ -101,25 +175,90 @@ const Transactions = ({ userId, userEmail, loginTimestamp, onLogout }) => {
     }, [fetchIndices]);
 
     useEffect(() => {
-        fetchTransactions();
+        rowsRef.current = transactions;
+    }, [transactions]);
 
-        socket.on('transaction_updated', (updatedTransaction) => {
-            setTransactions((prevTransactions) =>
-                prevTransactions.map((tx) =>
-                    tx.id === updatedTransaction.id ? { ...tx, ...updatedTransaction } : tx
-                )
-            );
-        });
+    // Apply a server-pushed delta in place; fall back to a full fetch if one was missed
+    const applyDelta = useCallback((delta) => {
+        if (delta.index !== selectedIndex) return;
+
+        const sync = syncRef.current;
+        if (delta.epoch !== sync.epoch || delta.base_seq > sync.seq) {
+            refreshTransactions();
+            return;
+        }
+        if (delta.seq <= sync.seq) return; // Already part of the page we fetched
+        syncRef.current = { ...sync, seq: delta.seq };
 
-        socket.on('new_data_available', () => {
+        // Rows relabelled out of the label filter; only those on screen are
+        // known to have been counted in the total
+        const evicted = new Set(delta.evicted);
+        const evictedOnScreen = rowsRef.current.filter((tx) => evicted.has(tx.id)).length;
+        const changed = new Map(delta.changed.map((change) => [change.id, change.fields]));
+        // New alerts are unreviewed and only belong on the first page; elsewhere just flag them
+        const countsNewAlerts = !labelFilter || labelFilter === 'unreviewed';
+        const showsNewAlerts = currentPage === 1 && countsNewAlerts;
+        const inserted = showsNewAlerts ? delta.inserted : [];
+        if (delta.inserted.length > 0 && !showsNewAlerts) {
             setNewDataAvailable(true);
+        }
+
+        setTransactions((prevTransactions) => {
+            const known = new Set(prevTransactions.map((tx) => tx.id));
+            const fresh = inserted.filter((tx) => !known.has(tx.id));
+            fresh.forEach((tx) => detailsRef.current.add(tx.id)); // Pushed alerts carry the whole document
+            return [...fresh, ...prevTransactions]
+                .filter((tx) => !evicted.has(tx.id))
+                .map((tx) => {
+                    const fields = changed.get(tx.id);
+                    return fields ? { ...tx, ...fields, data: { ...tx.data, ...fields } } : tx;
+                })
+                .slice(0, pageSize);
         });
+        setTotalTransactions((prevTotal) => prevTotal + (countsNewAlerts ? delta.inserted.length : 0) - evictedOnScreen);
+    }, [selectedIndex, currentPage, pageSize, labelFilter, refreshTransactions]);
+
+    useEffect(() => {
+        fetchTransactions();
+    }, [fetchTransactions]);
+
+    useEffect(() => {
+        socket.on('transactions_delta', applyDelta);
 
         return () => {
-            socket.off('transaction_updated');
-            socket.off('new_data_available');
+            socket.off('transactions_delta', applyDelta);
         };
-    }, [fetchTransactions]);
+    }, [applyDelta]);
+
+    // Only receive live events for the index and filters currently on screen
+    useEffect(() => {
+        if (!selectedIndex) return;
+        const subscription = {
+            index: selectedIndex,
+            order_id: orderId || null,
+            customer_id: customerId || null,
+            label: labelFilter || null,
+        };
+        // Rooms are lost when the socket reconnects; rejoin and ask the server
+        // to replay whatever was missed while disconnected
+        const resubscribe = () => {
+            const { epoch, seq } = syncRef.current;
+            socket.emit('subscribe', epoch ? { ...subscription, since: { epoch, seq } } : subscription);
+        };
+        const resync = (data) => {
+            if (data.index === selectedIndex) refreshTransactions();
+        };
+
+        socket.emit('subscribe', subscription);
+        socket.on('connect', resubscribe);
+        socket.on('resync_required', resync);
+
+        return () => {
+            socket.off('connect', resubscribe);
+            socket.off('resync_required', resync);
+            socket.emit('unsubscribe', subscription);
+        };
+    }, [selectedIndex, orderId, customerId, labelFilter, refreshTransactions]);
 
     return (
         <div>
@@ -127,14 +266,14 @@ const Transactions = ({ userId, userEmail, loginTimestamp, onLogout }) => {
 
             {newDataAvailable && (
                 <div style={{ marginBottom: '10px', color: 'red' }}>
-                    New data is available! <button onClick={fetchTransactions}>Refresh</button>
+                    New data is available! <button onClick={refreshTransactions}>Refresh</button>
                 </div>
             )}
 
             <div>
                 <label>
                     Select Index:
-                    <select value={selectedIndex} onChange={(e) => setSelectedIndex(e.target.value)}>
+                    <select value={selectedIndex} onChange={changeFilter(setSelectedIndex)}>
                         {indices.map((index) => (
                             <option key={index} value={index}>{index}</option>
                         ))}
@@ -145,7 +284,7 @@ const Transactions = ({ userId, userEmail, loginTimestamp, onLogout }) => {
             <div>
                 <label>
                     Page Size:
-                    <select value={pageSize} onChange={(e) => setPageSize(parseInt(e.target.value, 10))}>
+                    <select value={pageSize} onChange={changeFilter((value) => setPageSize(parseInt(value, 10)))}>
                         <option value={5}>5</option>
                         <option value={10}>10</option>
                         <option value={20}>20</option>
@@ -158,14 +297,27 @@ const Transactions = ({ userId, userEmail, loginTimestamp, onLogout }) => {
             <div>
                 <label>
                     Order ID:
-                    <input type="text" value={orderId} onChange={(e) => setOrderId(e.target.value)} />
+                    <input type="text" value={orderId} onChange={changeFilter(setOrderId)} />
                 </label>
             </div>
 
             <div>
                 <label>
                     Customer ID:
-                    <input type="text" value={customerId} onChange={(e) => setCustomerId(e.target.value)} />
+                    <input type="text" value={customerId} onChange={changeFilter(setCustomerId)} />
+                </label>
+            </div>
+
+            <div>
+                <label>
+                    Label:
+                    <select value={labelFilter} onChange={changeFilter(setLabelFilter)}>
+                        <option value="">All</option>
+                        <option value="unreviewed">Unreviewed</option>
+                        <option value="Genuine">Genuine</option>
+                        <option value="Fraudulent">Fraudulent</option>
+                        <option value="Suspicious">Suspicious</option>
+                    </select>
                 </label>
             </div>
 
@@ -174,6 +326,7 @@ const Transactions = ({ userId, userEmail, loginTimestamp, onLogout }) => {
                 transactions={transactions}
                 expandedRows={expandedRows}
                 toggleRowExpansion={toggleRowExpansion}
+                onLabelChange={handleLabelChange}
             />
 
             {/* Pagination Controls at the Bottom */}
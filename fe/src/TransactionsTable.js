@@ -23,7 +23,7 @@ const formatOrderTime = (dateString) => {
     return `${formattedDate}, ${formattedTime}`;
 };
 
-const TransactionsTable = ({ transactions, expandedRows, toggleRowExpansion }) => {
+const TransactionsTable = ({ transactions, expandedRows, toggleRowExpansion, onLabelChange }) => {
     return (
         <table style={{ width: '100%', borderCollapse: 'collapse' }}>
             <thead>
@@ -71,7 +71,8 @@ const TransactionsTable = ({ transactions, expandedRows, toggleRowExpansion }) =
                                 <td>{tx.data.Products ? tx.data.Products.map(p => p['Product Name']).join(', ') : 'No Products'}</td>
                                 <td>{tx.data['Total Price']}</td>
                                 <td>
-                                    <select>
+                                    <select value={tx.label || ''} onChange={(e) => onLabelChange(tx, e.target.value)}>
+                                        <option value="">Unreviewed</option>
                                         <option>Genuine</option>
                                         <option>Fraudulent</option>
                                         <option>Suspicious</option>
@@ -95,6 +96,16 @@ const TransactionsTable = ({ transactions, expandedRows, toggleRowExpansion }) =
                                                         </p>
                                                     )
                                                 ))}
+                                                {tx.velocity && (
+                                                    <>
+                                                        <h5>Customer Velocity:</h5>
+                                                        {Object.entries(tx.velocity).map(([window, features]) => (
+                                                            <p key={window}>
+                                                                <strong>Last {window}:</strong> {features.orders} orders, {features.total_price} total, {features.countries} countries
+                                                            </p>
+                                                        ))}
+                                                    </>
+                                                )}
                                             </div>
                                             {/* Second Column */}
                                             <div>
@@ -125,6 +136,7 @@ TransactionsTable.propTypes = {
     transactions: PropTypes.array.isRequired,
     expandedRows: PropTypes.array.isRequired,
     toggleRowExpansion: PropTypes.func.isRequired,
+    onLabelChange: PropTypes.func.isRequired,
 };
 
 export default TransactionsTable;